@@ -1,71 +1,106 @@
 import sys
 from os import environ
 
-from rich import print
+from . import startup
+from . import server
+from . import scripts
 
-from .shell import ClamShell
-from .shell_utils import (
-    files,
-    delete,
-    search,
-    copy,
-    move,
-    goto,
-    read,
-    make_file,
-    make_directory,
-    run,
-    clear,
-    pipe,
-    splitter,
-)
+server.attach_if_running()
 
+with startup.phase("imports"):
+    from rich import print
 
-clamshell = ClamShell(
-    super_commands=["files", "exit", "clear"],
-    aliases={"_": "_"},
-    shell_globals=globals(),
-    shell_locals=locals(),
-)
+    from .shell import ClamShell
+    from .job_control import jobs, fg, wait, kill_job, background
+    from .shell_utils import (
+        files,
+        delete,
+        search,
+        index_directory,
+        unindex_directory,
+        copy,
+        move,
+        goto,
+        read,
+        make_file,
+        make_directory,
+        run,
+        clear,
+        pipe,
+        stream,
+        rehash,
+        splitter,
+        start_indexes,
+    )
 
-try:
-    rc_path, rc_file = clamshell.rc_file().rsplit(splitter, 1)
-    sys.path.append(rc_path)
-    from clamrc import *
+if scripts.script_argument() is None:
+    with startup.phase("directory map"):
+        start_indexes()
 
-    if "super_commands" in locals():
-        clamshell.super_commands += super_commands
-        del super_commands
-    if "aliases" in locals():
-        clamshell.aliases.update(aliases)
-        del aliases
-    if "get_prompt" in locals():
-        clamshell.get_prompt = get_prompt
-        del get_prompt
-    if "get_continuation_prompt" in locals():
-        clamshell.get_continuation_prompt = get_continuation_prompt
-        del get_continuation_prompt
-    if "environment_variables" in locals():
-        for k, v in environment_variables.items():
-            environ[k] = v
-        del environment_variables
-    del splitter
-    del sys
-    del rc_path
-    del rc_file
-except Exception as e:
-    print(
-        "[red]Error loading/running clamrc!\n"
-        f"{e}\n"
-        "(likely error in .config/clamrc.py script)[/red]"
+with startup.phase("session/history"):
+    clamshell = ClamShell(
+        super_commands=["files", "exit", "clear", "jobs", "fg", "wait", "rehash", "page"],
+        aliases={"_": "_"},
+        shell_globals=globals(),
+        shell_locals=locals(),
+        interactive=scripts.script_argument() is None,
     )
 
-def run_clam():
+history = clamshell.search_history
+page = clamshell.page
+
+with startup.phase("rc"):
+    try:
+        rc_path, rc_file = clamshell.rc_file().rsplit(splitter, 1)
+        sys.path.append(rc_path)
+        from clamrc import *
+
+        if "super_commands" in locals():
+            clamshell.super_commands += super_commands
+            del super_commands
+        if "aliases" in locals():
+            clamshell.aliases.update(aliases)
+            del aliases
+        if "get_prompt" in locals():
+            clamshell.get_prompt = get_prompt
+            del get_prompt
+        if "get_continuation_prompt" in locals():
+            clamshell.get_continuation_prompt = get_continuation_prompt
+            del get_continuation_prompt
+        if "show_timings" in locals():
+            clamshell.show_timings = show_timings
+            del show_timings
+        if "trace_file" in locals():
+            clamshell.trace_file = trace_file
+            del trace_file
+        if "environment_variables" in locals():
+            for k, v in environment_variables.items():
+                environ[k] = v
+            del environment_variables
+        del splitter
+        del sys
+        del rc_path
+        del rc_file
+    except Exception as e:
+        print(
+            "[red]Error loading/running clamrc!\n"
+            f"{e}\n"
+            "(likely error in .config/clamrc.py script)[/red]"
+        )
+
+startup.report_if_asked()
+
+def run_repl():
     while True:
         try:
             clamshell.repl()
         except KeyboardInterrupt:
             pass
 
+def run_clam():
+    scripts.run_if_given(clamshell)
+    server.serve_if_asked(clamshell, run_repl)
+    run_repl()
+
 if __name__ == '__main__':
     run_clam()
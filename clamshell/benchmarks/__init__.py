@@ -0,0 +1,3 @@
+"""
+Benchmarks for clamshell's hot paths, run with python -m clamshell.benchmarks
+"""
@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m clamshell.benchmarks",
+        description="Times clamshell's hot paths on a synthetic tree and history",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per case")
+    parser.add_argument("--only", help="only run cases with this in their name")
+    parser.add_argument("--json", action="store_true", help="print results as json")
+    parser.add_argument("--output", help="also write results (as json) to this file")
+    parser.add_argument("--baseline", help="baseline file to compare against")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="save results as the new baseline"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, help="fraction slower than baseline that fails"
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    arguments: argparse.Namespace = parse_arguments()
+    with tempfile.TemporaryDirectory(prefix="clamshell-benchmarks-") as home:
+        # clamshell reads home (and keeps its config there) when first imported,
+        # so point it somewhere disposable before importing anything
+        os.environ["HOME"] = home
+        os.environ["USERPROFILE"] = home
+        os.environ["COLUMNS"], os.environ["LINES"] = "120", "40"
+        from . import fixtures, runner
+        from .cases import cases
+
+        root: str = os.path.join(home, "bench")
+        fixtures.build_tree(root)
+        fixtures.build_history(os.path.join(home, ".config", "clamshell", "history"))
+        if arguments.tolerance is not None:
+            runner.tolerance = arguments.tolerance
+        try:
+            results: dict = runner.run(cases(root), arguments.repeat, arguments.only)
+        finally:
+            os.chdir(os.path.dirname(home))
+    baseline_path: str = arguments.baseline or runner.baseline_file
+    if arguments.save_baseline:
+        runner.save(results, baseline_path)
+    comparison: dict = runner.compare(results, runner.load(baseline_path))
+    if arguments.output:
+        runner.save({**results, "comparison": comparison}, arguments.output)
+    if arguments.json:
+        print(json.dumps({**results, "comparison": comparison}, indent=2))
+    else:
+        runner.report(results, comparison)
+    return int(any(i["regression"] for i in comparison.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
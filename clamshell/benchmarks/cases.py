@@ -0,0 +1,148 @@
+import io
+import os
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable, List, NamedTuple
+
+from .. import meta_functions, shell_utils
+from ..shell import ClamShell
+from ..indexes import DirectoryMap
+from ..types import FileList
+from . import fixtures
+
+
+class Case(NamedTuple):
+    """
+    One benchmark: function is timed number times per repeat, after
+    setup (untimed) and check (which must pass after the warm up run,
+    so an error path is never timed by mistake)
+    """
+
+    name: str
+    function: Callable
+    number: int = 1
+    setup: Callable = None
+    check: Callable = None
+
+
+def all_columns(listing: FileList) -> FileList:
+    # files reads columns lazily, so load them all as showing or filtering would
+    for column in listing.columns:
+        listing.raw(column)
+    return listing
+
+
+def quiet(function: Callable) -> Callable:
+    def wrapped_function():
+        with redirect_stdout(io.StringIO()):
+            return function()
+
+    return wrapped_function
+
+
+def succeeded(shell: ClamShell) -> Callable:
+    return lambda: not meta_functions.is_error(shell.output)
+
+
+def run_command(shell: ClamShell, command: str, cached: bool) -> Callable:
+    def run():
+        if not cached:
+            shell.dispatch_cache.clear()
+        shell.command = command
+        shell.meta_exec()
+
+    return run
+
+
+def cases(root: str) -> List[Case]:
+    """
+    Returns benchmark cases over the synthetic tree at root
+    (built by fixtures.build_tree, below the home directory)
+    """
+    home: str = shell_utils.home
+    cold_map_file: str = os.path.join(shell_utils.config_directory, "cold_map.json")
+    flat: str = os.path.join(root, "flat")
+    target: str = fixtures.folder_name(fixtures.projects // 2, fixtures.folders_per_project - 1)
+    with redirect_stderr(io.StringIO()):
+        # prompt_toolkit warns when there's no terminal, which is fine here
+        shell: ClamShell = ClamShell(shell_globals={"greet": lambda *names: len(names)})
+    shell.lexer_thread.join()
+    shell.max_rows = 40
+    shell_utils.start_indexes()
+    shell_utils.directory_map.join()
+    shell_utils.index_directory(root)
+    tree: FileList = all_columns(shell_utils.files(root, recursive=3))
+    source: str = os.path.join(
+        root, fixtures.project_name(0), fixtures.folder_name(0, 0), "file_0.py"
+    )
+    line: str = " ".join(
+        f'name_{i} "quoted {i} words" \'single {i}\'' for i in range(40)
+    )
+
+    def goto_target():
+        shell_utils.goto(target)
+        assert os.path.basename(os.getcwd()) == target
+
+    def show(output):
+        def print_it():
+            shell.output = output
+            shell.print_output()
+
+        return print_it
+
+    return [
+        Case("directory_map refresh", shell_utils.directory_map.refresh, 5),
+        Case(
+            "directory_map refresh cold",
+            lambda: DirectoryMap(home, cold_map_file).refresh(),
+            5,
+        ),
+        Case(
+            "find_directory",
+            lambda: shell_utils.find_directory(target),
+            200,
+            check=lambda: len(shell_utils.find_directory(target)) > 0,
+        ),
+        Case("files flat", lambda: all_columns(shell_utils.files(flat)), 5),
+        Case(
+            "files recursive",
+            lambda: all_columns(shell_utils.files(root, recursive=3)),
+        ),
+        Case("goto", goto_target, 20, setup=lambda: os.chdir(home)),
+        Case(
+            "search",
+            lambda: shell_utils.search("needle", root, recursive=3, indexed=False),
+        ),
+        Case(
+            "search indexed",
+            lambda: shell_utils.search("needle", root, recursive=3),
+        ),
+        Case("history search", lambda: shell.search_history("git commit"), 20),
+        Case("history search rare", lambda: shell.search_history("needle_996"), 20),
+        Case(
+            "meta_exec python",
+            run_command(shell, "total = sum(range(100))", False),
+            200,
+            check=succeeded(shell),
+        ),
+        Case(
+            "meta_exec python cached",
+            run_command(shell, "total = sum(range(100))", True),
+            1000,
+            check=succeeded(shell),
+        ),
+        Case(
+            "meta_exec clam",
+            run_command(shell, "greet world again", False),
+            200,
+            check=succeeded(shell),
+        ),
+        Case(
+            "meta_exec shell",
+            run_command(shell, "true", False),
+            20,
+            check=succeeded(shell),
+        ),
+        Case("sandwich_split", lambda: shell.sandwich_split(line), 1000),
+        Case("print_output table", quiet(show(tree)), 10),
+        Case("print_output text", quiet(show(shell_utils.read(source))), 10),
+    ]
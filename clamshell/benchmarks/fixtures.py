@@ -0,0 +1,82 @@
+import os
+import time
+from typing import List
+
+# synthetic project tree: projects x folders x files, plus one flat folder
+projects: int = 40
+folders_per_project: int = 8
+files_per_folder: int = 25
+flat_files: int = 5000
+history_entries: int = 20000
+
+source_lines: List[str] = [
+    "import os",
+    "",
+    "",
+    "def handle(request, retries=3):",
+    '    """Handles a request, retrying on failure"""',
+    "    for attempt in range(retries):",
+    "        result = request.send()",
+    "        if result.ok:",
+    "            return result",
+    "    raise RuntimeError(f'gave up after {retries} attempts')",
+]
+
+history_commands: List[str] = [
+    "git status",
+    "git commit -m 'fix {0}'",
+    "goto project_{0}",
+    "files recursive=2",
+    "search needle_{0}",
+    "read module_{0}.py head=20",
+    "x = [i ** 2 for i in range({0})]",
+    "ls -la | grep {0}",
+    "copy build_{0} backups",
+    "pip install package-{0}",
+]
+
+
+def project_name(project: int) -> str:
+    return f"project_{project:02d}"
+
+
+def folder_name(project: int, folder: int) -> str:
+    # unique across the whole tree, so goto has a single best match
+    return f"module_{project:02d}_{folder}"
+
+
+def build_tree(root: str) -> None:
+    """
+    Writes the synthetic tree below root: root/project_NN/module_NN_M/*.py
+    (one file in ten containing "needle") and root/flat/ with flat_files files
+    """
+    for project in range(projects):
+        for folder in range(folders_per_project):
+            directory: str = os.path.join(
+                root, project_name(project), folder_name(project, folder)
+            )
+            os.makedirs(directory, exist_ok=True)
+            for number in range(files_per_folder):
+                lines: List[str] = list(source_lines)
+                if number % 10 == 0:
+                    lines.append(f"# needle {project} {folder} {number}")
+                with open(os.path.join(directory, f"file_{number}.py"), "w") as file:
+                    file.write("\n".join(lines * 4) + "\n")
+    flat: str = os.path.join(root, "flat")
+    os.makedirs(flat, exist_ok=True)
+    for number in range(flat_files):
+        with open(os.path.join(flat, f"item_{number:05d}.txt"), "w") as file:
+            file.write(f"item {number}\n")
+
+
+def build_history(path: str) -> None:
+    """
+    Writes a plain text (prompt_toolkit FileHistory format) history file
+    of history_entries commands, which the shell imports on startup
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        for number in range(history_entries):
+            command: str = history_commands[number % len(history_commands)]
+            file.write(f"\n# {time.ctime(number)}\n")
+            file.write(f"+{command.format(number % 997)}\n")
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import platform
+import statistics
+from typing import Dict, List
+
+from .cases import Case
+
+# file results are saved to with --save-baseline and compared against
+baseline_file: str = os.path.join(os.path.dirname(__file__), "baseline.json")
+# a case regresses when its best time is this fraction slower than baseline
+tolerance: float = 0.5
+
+
+def time_case(case: Case, repeat: int) -> Dict[str, float]:
+    """
+    Returns best and median seconds per call of case.function,
+    over repeat rounds of case.number calls (after one warm up call)
+    """
+    if case.setup is not None:
+        case.setup()
+    case.function()
+    if case.check is not None:
+        assert case.check(), f"{case.name} failed its check after warming up"
+    timings: List[float] = []
+    for _ in range(repeat):
+        if case.setup is not None:
+            case.setup()
+        start: float = time.perf_counter()
+        for _ in range(case.number):
+            case.function()
+        timings.append((time.perf_counter() - start) / case.number)
+    return {
+        "best": min(timings),
+        "median": statistics.median(timings),
+        "repeat": repeat,
+        "number": case.number,
+    }
+
+
+def run(cases: List[Case], repeat: int, only: str = None) -> dict:
+    """
+    Times each case (or those with only in their name), returning
+    results as saved in baseline.json
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {
+            case.name: time_case(case, repeat)
+            for case in cases
+            if only is None or only in case.name
+        },
+    }
+
+
+def load(path: str) -> dict:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def save(results: dict, path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+        file.write("\n")
+
+
+def compare(results: dict, baseline: dict) -> Dict[str, dict]:
+    """
+    Returns, for each case also in baseline, its best time as a ratio
+    of the baseline's and whether that counts as a regression
+    """
+    comparison: Dict[str, dict] = {}
+    for name, result in results["results"].items():
+        before: dict = (baseline or {}).get("results", {}).get(name)
+        if before is None:
+            continue
+        ratio: float = result["best"] / before["best"]
+        comparison[name] = {"ratio": ratio, "regression": ratio > 1 + tolerance}
+    return comparison
+
+
+def report(results: dict, comparison: Dict[str, dict]) -> None:
+    """
+    Prints results as a table, with change against baseline
+    """
+    from rich import print
+    from rich.table import Table
+
+    table: Table = Table(box=None)
+    for column in ("case", "best", "median", "vs baseline"):
+        table.add_column(column, justify="left" if column == "case" else "right")
+    for name, result in results["results"].items():
+        change: str = ""
+        if name in comparison:
+            ratio: float = comparison[name]["ratio"]
+            colour: str = "red bold" if comparison[name]["regression"] else "green"
+            change = f"[{colour}]{ratio:.2f}x[/{colour}]"
+        table.add_row(
+            name, format_seconds(result["best"]), format_seconds(result["median"]), change
+        )
+    print(table)
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
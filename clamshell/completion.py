@@ -0,0 +1,193 @@
+import os
+import keyword
+import builtins
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Tuple
+
+from prompt_toolkit.completion import CompleteEvent, Completer, Completion
+from prompt_toolkit.document import Document
+
+
+class ListingCache:
+    """
+    Caches directory listings, re-reading a directory only when
+    its mtime changes
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size: int = max_size
+        self.listings: OrderedDict = OrderedDict()
+
+    def list(self, directory: str) -> List[Tuple[str, bool]]:
+        """
+        Returns (name, is_directory) for each entry in directory
+        """
+        try:
+            mtime: float = os.stat(directory).st_mtime
+        except OSError:
+            return []
+        cached: Tuple[float, List[Tuple[str, bool]]] = self.listings.get(directory)
+        if cached is not None and cached[0] == mtime:
+            self.listings.move_to_end(directory)
+            return cached[1]
+        try:
+            with os.scandir(directory) as entries:
+                listing: List[Tuple[str, bool]] = [(i.name, i.is_dir()) for i in entries]
+        except OSError:
+            listing = []
+        self.listings[directory] = (mtime, listing)
+        if len(self.listings) > self.max_size:
+            self.listings.popitem(last=False)
+        return listing
+
+
+class ExecutableCache:
+    """
+    Names of executables on $PATH, with each $PATH directory only
+    re-listed when its mtime (or $PATH itself) changes
+    """
+
+    def __init__(self, listings: ListingCache):
+        self.listings: ListingCache = listings
+        self.path: str = None
+        self.names: List[str] = []
+        self.mtimes: List[float] = []
+
+    def directories(self) -> List[str]:
+        return [i for i in os.environ.get("PATH", "").split(os.pathsep) if i]
+
+    def get_mtimes(self) -> List[float]:
+        mtimes: List[float] = []
+        for directory in self.directories():
+            try:
+                mtimes.append(os.stat(directory).st_mtime)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def get(self) -> List[str]:
+        """
+        Returns sorted names of executables on $PATH
+        """
+        mtimes: List[float] = self.get_mtimes()
+        if self.path == os.environ.get("PATH") and self.mtimes == mtimes:
+            return self.names
+        names: set = set()
+        for directory in self.directories():
+            for name, is_directory in self.listings.list(directory):
+                if not is_directory and os.access(os.path.join(directory, name), os.X_OK):
+                    names.add(name)
+        self.path, self.mtimes, self.names = os.environ.get("PATH"), mtimes, sorted(names)
+        return self.names
+
+
+class ClamCompleter(Completer):
+    """
+    Completes python names (and attributes), executables on $PATH,
+    file paths, and for goto, directories from the directory map
+    """
+
+    def __init__(
+        self,
+        get_namespaces: Callable[[], Iterable[dict]],
+        get_commands: Callable[[], Iterable[str]] = list,
+        get_directories: Callable[[str], List[str]] = None,
+    ):
+        self.get_namespaces: Callable[[], Iterable[dict]] = get_namespaces
+        self.get_commands: Callable[[], Iterable[str]] = get_commands
+        self.get_directories: Callable[[str], List[str]] = get_directories
+        self.listings: ListingCache = ListingCache()
+        self.executables: ExecutableCache = ExecutableCache(self.listings)
+
+    def get_completions(
+        self, document: Document, complete_event: CompleteEvent
+    ) -> Iterable[Completion]:
+        line: str = document.current_line_before_cursor
+        words: List[str] = line.split()
+        if line == "" or line[-1].isspace():
+            words.append("")
+        word: str = words[-1].lstrip("\"'([{,")
+        first: bool = len(words) == 1
+        seen: set = set()
+        sources: List[Iterable[Completion]] = []
+        if "." in word and not word.startswith(".") and "/" not in word:
+            sources.append(self.attribute_completions(word))
+        elif first:
+            sources += [self.name_completions(word), self.command_completions(word)]
+        else:
+            if words[0] == "goto" and self.get_directories is not None:
+                sources.append(self.mapped_directory_completions(word, words[-1]))
+            sources += [self.path_completions(word), self.name_completions(word)]
+        for source in sources:
+            for completion in source:
+                if completion.text not in seen:
+                    seen.add(completion.text)
+                    yield completion
+
+    def name_completions(self, word: str) -> Iterable[Completion]:
+        names: set = set(dir(builtins)) | set(keyword.kwlist)
+        for namespace in self.get_namespaces():
+            names.update(namespace)
+        for name in sorted(names):
+            if name.startswith(word) and (word.startswith("_") or not name.startswith("_")):
+                yield Completion(name, -len(word), display_meta="python")
+
+    def attribute_completions(self, word: str) -> Iterable[Completion]:
+        base, attribute = word.rsplit(".", 1)
+        root, *attributes = base.split(".")
+        value = None
+        for namespace in list(self.get_namespaces()) + [vars(builtins)]:
+            if root in namespace:
+                value = namespace[root]
+                break
+        else:
+            return
+        try:
+            for i in attributes:
+                value = getattr(value, i)
+        except Exception:
+            return
+        for name in sorted(dir(value)):
+            if name.startswith(attribute) and (
+                attribute.startswith("_") or not name.startswith("_")
+            ):
+                yield Completion(name, -len(attribute), display_meta="attribute")
+
+    def command_completions(self, word: str) -> Iterable[Completion]:
+        for name in sorted(self.get_commands()):
+            if name.startswith(word):
+                yield Completion(name, -len(word), display_meta="command")
+        if word == "":
+            # listing every executable isn't helpful
+            return
+        for name in self.executables.get():
+            if name.startswith(word):
+                yield Completion(name, -len(word), display_meta="executable")
+
+    def path_completions(self, word: str) -> Iterable[Completion]:
+        directory, partial = os.path.split(word)
+        listing_directory: str = os.path.expanduser(directory) or "."
+        for name, is_directory in sorted(self.listings.list(listing_directory)):
+            if not name.startswith(partial):
+                continue
+            if name.startswith(".") and not partial.startswith("."):
+                continue
+            yield Completion(
+                name + (os.sep if is_directory else ""),
+                -len(partial),
+                display_meta="directory" if is_directory else "file",
+            )
+
+    def mapped_directory_completions(self, word: str, typed: str) -> Iterable[Completion]:
+        if word == "":
+            return
+        # paths go in as string literals (replacing any quote already typed),
+        # as a bare /a/b would be run as python division
+        quoted: bool = typed[: -len(word)].endswith(("'", '"'))
+        for path in self.get_directories(word):
+            yield Completion(
+                repr(path),
+                -len(word) - quoted,
+                display=os.path.basename(path.rstrip(os.sep)) or path,
+                display_meta=path,
+            )
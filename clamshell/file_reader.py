@@ -0,0 +1,139 @@
+import os
+import mmap
+import time
+from contextlib import contextmanager
+from typing import Iterator, Tuple, Union
+
+from .types import FileText
+
+# files up to this size are read whole unless a range is asked for
+read_limit: int = 1024 * 1024
+# number of lines given when a bigger file is read without a range
+preview_lines: int = 1000
+# most bytes given then too (for files with very long lines, or none)
+preview_bytes: int = 64 * 1024
+# bytes scanned at a time when counting lines
+chunk_size: int = 1024 * 1024
+# seconds between checks for new data when following a file
+follow_interval: float = 0.25
+
+
+@contextmanager
+def mapped(path: str) -> Iterator:
+    """
+    Memory maps file at path read-only (reading it normally if it says
+    it's empty, as can't be mapped, or for files like those in /proc)
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield file.read()
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def line_offset(data, line: int, position: int = 0) -> int:
+    """
+    Returns offset of the start of line (counting from 1, at position),
+    or the end of data if there aren't that many lines
+    """
+    remaining: int = line - 1
+    while remaining > 0 and position < len(data):
+        chunk: bytes = data[position : position + chunk_size]
+        count: int = chunk.count(b"\n")
+        if count >= remaining:
+            rest: bytes = chunk.split(b"\n", remaining)[-1]
+            return position + len(chunk) - len(rest)
+        remaining -= count
+        position += len(chunk)
+    return min(position, len(data))
+
+
+def tail_offset(data, lines: int) -> int:
+    """
+    Returns offset of the start of the last lines lines
+    """
+    # a newline at the very end finishes the last line rather than starting one
+    position: int = len(data) - 1 if data[-1:] == b"\n" else len(data)
+    if lines <= 0:
+        return len(data)
+    remaining: int = lines
+    while position > 0:
+        start: int = max(0, position - chunk_size)
+        chunk: bytes = data[start:position]
+        count: int = chunk.count(b"\n")
+        if count >= remaining:
+            return start + len(chunk.rsplit(b"\n", remaining)[0]) + 1
+        remaining -= count
+        position = start
+    return 0
+
+
+def decode(data: bytes) -> str:
+    return data.decode(errors="replace")
+
+
+def read(
+    path: str,
+    head: int = None,
+    tail: int = None,
+    lines: Union[int, Tuple[int, int]] = None,
+    byte_range: Tuple[int, int] = None,
+) -> FileText:
+    """
+    Returns part of the file at path: its first head lines, last tail lines,
+    lines (a line number, or (first, last) counting from 1) or byte_range
+    ((start, stop) offsets). Without any of those, small files are read
+    whole and bigger ones give their first preview_lines lines (cut short,
+    at a line end if there is one, after preview_bytes).
+    Only the part asked for is read, through a memory map.
+    """
+    with mapped(path) as data:
+        size: int = len(data)
+        if byte_range is not None:
+            start, stop = byte_range
+            return FileText(decode(data[start:stop]), path, None, size, False)
+        if tail is not None:
+            start = tail_offset(data, tail)
+            return FileText(decode(data[start:]), path, None, size, start == 0)
+        if lines is not None:
+            first, last = (lines, lines) if isinstance(lines, int) else lines
+            start = line_offset(data, first)
+            stop: int = line_offset(data, last - first + 2, start)
+            return FileText(
+                decode(data[start:stop]), path, first, size, start == 0 and stop == size
+            )
+        if head is None and size <= read_limit:
+            return FileText(decode(data[:]), path, 1, size, True)
+        stop = line_offset(data, (head or preview_lines) + 1)
+        if head is None and stop > preview_bytes:
+            stop = data.rfind(b"\n", 0, preview_bytes) + 1 or preview_bytes
+        return FileText(decode(data[:stop]), path, 1, size, stop == size)
+
+
+def follow(path: str, tail: int = 10) -> Iterator[str]:
+    """
+    Yields the last tail lines of the file at path, then each line
+    written to it from then on (like tail -f), starting again from
+    the top if the file is truncated
+    """
+    with mapped(path) as data:
+        start: int = tail_offset(data, tail)
+        position: int = len(data)
+        existing: bytes = data[start:position]
+    for line in existing.splitlines():
+        yield decode(line)
+    with open(path, "rb") as file:
+        file.seek(position)
+        partial: bytes = b""
+        while True:
+            chunk: bytes = file.read(chunk_size)
+            if not chunk:
+                if os.path.getsize(path) < file.tell():
+                    file.seek(0)
+                    partial = b""
+                time.sleep(follow_interval)
+                continue
+            *complete, partial = (partial + chunk).split(b"\n")
+            for line in complete:
+                yield decode(line).rstrip("\r")
@@ -0,0 +1,260 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Iterable, List, Tuple
+
+from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.document import Document
+from prompt_toolkit.history import FileHistory, History
+
+from .types import FileList
+
+
+def prefix_bounds(prefix: str) -> Tuple[str, str]:
+    """
+    Returns (low, high) such that low <= text < high for any text
+    starting with prefix, so prefix lookups can use an index
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SQLiteHistory(History):
+    """
+    Command history kept in SQLite: one row per distinct command (with a
+    use count, last use and the directories it was used in), pruned to
+    max_entries, and only the most recent load_limit loaded for arrow keys.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        import_file: str = None,
+        max_entries: int = 100000,
+        load_limit: int = 10000,
+    ):
+        super().__init__()
+        self.database: str = database
+        self.max_entries: int = max_entries
+        self.load_limit: int = load_limit
+        self.stores: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        os.makedirs(os.path.dirname(database), exist_ok=True)
+        self.connection: sqlite3.Connection = sqlite3.connect(
+            database, check_same_thread=False
+        )
+        with self.lock, self.connection:
+            self.connection.executescript(
+                """
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS history (
+                    command TEXT PRIMARY KEY, count INTEGER, last_used REAL
+                );
+                CREATE INDEX IF NOT EXISTS history_by_last_used ON history (last_used);
+                CREATE TABLE IF NOT EXISTS directories (
+                    directory TEXT, command TEXT, last_used REAL,
+                    PRIMARY KEY (directory, command)
+                );
+                CREATE TABLE IF NOT EXISTS imported (path TEXT PRIMARY KEY);
+                """
+            )
+        self.indexed: bool = self.create_text_index()
+        if import_file is not None:
+            self.import_file(import_file)
+        self.prune()
+
+    def create_text_index(self) -> bool:
+        """
+        Adds a trigram full text index of commands (kept in step with
+        history by triggers) for search, returning False if this SQLite
+        can't (the trigram tokenizer needs 3.34), so search scans instead
+        """
+        with self.lock, self.connection:
+            if self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'history_text'"
+            ).fetchone():
+                return True
+            try:
+                self.connection.executescript(
+                    """
+                    CREATE VIRTUAL TABLE history_text USING fts5(
+                        command, content = 'history', tokenize = 'trigram'
+                    );
+                    CREATE TRIGGER history_text_insert AFTER INSERT ON history BEGIN
+                        INSERT INTO history_text (rowid, command)
+                        VALUES (new.rowid, new.command);
+                    END;
+                    CREATE TRIGGER history_text_delete AFTER DELETE ON history BEGIN
+                        INSERT INTO history_text (history_text, rowid, command)
+                        VALUES ('delete', old.rowid, old.command);
+                    END;
+                    INSERT INTO history_text (history_text) VALUES ('rebuild');
+                    """
+                )
+            except sqlite3.OperationalError:
+                return False
+        return True
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def import_file(self, path: str) -> None:
+        """
+        Copies entries from a plain text (prompt_toolkit FileHistory)
+        history file, once
+        """
+        with self.lock:
+            done: bool = self.connection.execute(
+                "SELECT 1 FROM imported WHERE path = ?", (path,)
+            ).fetchone()
+        if done or not os.path.exists(path):
+            return
+        # file history gives newest first, so count back in time to keep order
+        now: float = time.time()
+        entries: List[Tuple[str, float]] = [
+            (command, now - i)
+            for i, command in enumerate(FileHistory(path).load_history_strings())
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                """
+                INSERT INTO history VALUES (?, 1, ?) ON CONFLICT (command)
+                DO UPDATE SET count = count + 1, last_used = max(last_used, excluded.last_used)
+                """,
+                entries,
+            )
+            self.connection.execute("INSERT INTO imported VALUES (?)", (path,))
+
+    def load_history_strings(self) -> Iterable[str]:
+        with self.lock:
+            rows: List[Tuple[str]] = self.connection.execute(
+                "SELECT command FROM history ORDER BY last_used DESC LIMIT ?",
+                (self.load_limit,),
+            ).fetchall()
+        for (command,) in rows:
+            yield command
+
+    def append_string(self, string: str) -> None:
+        # keep arrow key history free of duplicates too
+        if string in self._loaded_strings:
+            self._loaded_strings.remove(string)
+        super().append_string(string)
+
+    def store_string(self, string: str) -> None:
+        now: float = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                INSERT INTO history VALUES (?, 1, ?) ON CONFLICT (command)
+                DO UPDATE SET count = count + 1, last_used = excluded.last_used
+                """,
+                (string, now),
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                (os.getcwd(), string, now),
+            )
+        self.stores += 1
+        if self.stores % 100 == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """
+        Drops the least recently used commands beyond max_entries
+        """
+        with self.lock, self.connection:
+            cutoff: Tuple[float] = self.connection.execute(
+                "SELECT last_used FROM history ORDER BY last_used DESC LIMIT 1 OFFSET ?",
+                (self.max_entries,),
+            ).fetchone()
+            if cutoff is None:
+                return
+            self.connection.execute(
+                "DELETE FROM history WHERE last_used <= ?", cutoff
+            )
+            self.connection.execute(
+                "DELETE FROM directories WHERE last_used <= ?", cutoff
+            )
+
+    def suggest(self, prefix: str, directory: str = None) -> str:
+        """
+        Returns most recent command starting with prefix, preferring
+        ones used in directory
+        """
+        if prefix == "":
+            return None
+        low, high = prefix_bounds(prefix)
+        with self.lock:
+            if directory is not None:
+                row: Tuple[str] = self.connection.execute(
+                    """
+                    SELECT command FROM directories
+                    WHERE directory = ? AND command >= ? AND command < ?
+                    ORDER BY last_used DESC LIMIT 1
+                    """,
+                    (directory, low, high),
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+            row = self.connection.execute(
+                """
+                SELECT command FROM history WHERE command >= ? AND command < ?
+                ORDER BY last_used DESC LIMIT 1
+                """,
+                (low, high),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def search(self, text: str = "", limit: int = 50) -> FileList:
+        """
+        Returns commands containing text (or each of its words, in order),
+        most recent first
+        """
+        words: List[str] = text.split()
+        pattern: str = "%" + "%".join(
+            i.replace("^", "^^").replace("%", "^%").replace("_", "^_") for i in words
+        ) + "%"
+        # the trigram index finds commands with every word of 3 or more
+        # characters in them, then LIKE checks for the rest, in order
+        phrases: List[str] = [
+            '"' + i.replace('"', '""') + '"' for i in words if len(i) >= 3
+        ]
+        query: str = """
+            SELECT command, count, last_used FROM history
+            WHERE command LIKE ? ESCAPE '^'
+        """
+        parameters: tuple = (pattern,)
+        if self.indexed and phrases:
+            query += """
+                AND rowid IN (SELECT rowid FROM history_text WHERE history_text MATCH ?)
+            """
+            parameters += (" ".join(phrases),)
+        with self.lock:
+            rows: List[Tuple[str, int, float]] = self.connection.execute(
+                query + "ORDER BY last_used DESC LIMIT ?", (*parameters, limit)
+            ).fetchall()
+        return FileList(
+            {"command": command, "count": count, "last used": last_used}
+            for command, count, last_used in rows
+        )
+
+
+class HistoryAutoSuggest(AutoSuggest):
+    """
+    Suggests completions of the current line from SQLiteHistory,
+    using its index rather than scanning every entry
+    """
+
+    def __init__(self, history: SQLiteHistory):
+        self.history: SQLiteHistory = history
+
+    def get_suggestion(self, buffer: Buffer, document: Document) -> Suggestion:
+        text: str = document.text.rsplit("\n", 1)[-1]
+        if not text.strip():
+            return None
+        command: str = self.history.suggest(text, os.getcwd())
+        if command is None:
+            return None
+        return Suggestion(command[len(text) :].split("\n", 1)[0])
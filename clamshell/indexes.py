@@ -0,0 +1,469 @@
+import os
+import json
+import time
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+from . import meta_functions
+
+
+@meta_functions.try_else_empty_list
+def list_subdirectories(path: str, hidden: bool = False) -> List[str]:
+    """
+    Returns absolute paths of directories directly inside path
+    """
+    with os.scandir(path) as entries:
+        return [
+            entry.path
+            for entry in entries
+            if (hidden or not entry.name.startswith("."))
+            and entry.is_dir(follow_symlinks=False)
+        ]
+
+
+@meta_functions.try_else_none
+def get_mtime(path: str) -> float:
+    return os.stat(path).st_mtime
+
+
+class DirectoryMap:
+    """
+    Persistent map of directories below a root folder, used by goto.
+
+    Each mapped directory is stored with its mtime and its children, so
+    a refresh only lists directories that have changed since last time.
+    """
+
+    def __init__(self, root: str, cache_file: str, max_depth: int = 2):
+        self.root: str = root
+        self.cache_file: str = cache_file
+        self.max_depth: int = max_depth
+        self.children: Dict[str, Tuple[float, List[str]]] = {}
+        self.paths: List[str] = []
+        self.suffixes: Dict[str, List[str]] = {}
+        self.names: List[Tuple[str, str]] = []
+        self.refresh_thread: threading.Thread = None
+        self.refreshed: threading.Event = threading.Event()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.children
+
+    @meta_functions.try_else_none
+    def load(self) -> None:
+        """
+        Reads previously saved map from cache file
+        """
+        with open(self.cache_file, "r") as file:
+            cached: dict = json.load(file)
+        if cached.get("root") != self.root or cached.get("max_depth") != self.max_depth:
+            return
+        self.children = {k: (v[0], v[1]) for k, v in cached["children"].items()}
+        self.paths = list(self.children)
+        self.suffixes = self.index_suffixes(self.paths)
+
+    @meta_functions.try_else_none
+    def save(self) -> None:
+        """
+        Writes current map to cache file (via a temporary file, so that
+        a concurrently starting shell never reads a half written map)
+        """
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temporary_file: str = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(temporary_file, "w") as file:
+            json.dump(
+                {
+                    "root": self.root,
+                    "max_depth": self.max_depth,
+                    "children": self.children,
+                },
+                file,
+            )
+        os.replace(temporary_file, self.cache_file)
+
+    def walk(
+        self,
+        path: str,
+        current_depth: int,
+        old_children: Dict[str, Tuple[float, List[str]]],
+        new_children: Dict[str, Tuple[float, List[str]]],
+    ) -> None:
+        """
+        Maps path and its subdirectories into new_children, only listing
+        directories whose mtime differs from that in old_children
+        """
+        mtime: float = get_mtime(path)
+        if mtime is None:
+            return
+        if current_depth > self.max_depth:
+            new_children[path] = (mtime, [])
+            return
+        cached: Tuple[float, List[str]] = old_children.get(path)
+        if cached is not None and cached[0] == mtime:
+            subdirectories: List[str] = cached[1]
+        else:
+            subdirectories = list_subdirectories(path)
+            # lets get rid of windows non-dot "AppData" which will map too many things
+            if os.name == "nt":
+                subdirectories = [i for i in subdirectories if "AppData" not in i]
+        new_children[path] = (mtime, subdirectories)
+        for subdirectory in subdirectories:
+            self.walk(subdirectory, current_depth + 1, old_children, new_children)
+
+    def index_suffixes(self, paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Maps every trailing run of path components ("c", "b/c", "a/b/c")
+        to the directories ending in it
+        """
+        suffixes: Dict[str, List[str]] = {}
+        for path in paths:
+            parts: List[str] = path.rstrip(os.sep).split(os.sep)
+            for i in range(1, len(parts)):
+                suffixes.setdefault(os.sep.join(parts[-i:]), []).append(path)
+        self.names = sorted((os.path.basename(i.rstrip(os.sep)), i) for i in paths)
+        return suffixes
+
+    def starting_with(self, prefix: str) -> List[str]:
+        """
+        Returns mapped directories whose name starts with prefix
+        """
+        names: List[Tuple[str, str]] = self.names
+        start: int = bisect.bisect_left(names, (prefix, ""))
+        found: List[str] = []
+        for name, path in names[start:]:
+            if not name.startswith(prefix):
+                break
+            found.append(path)
+        return found
+
+    def matches(self, name: str) -> List[str]:
+        """
+        Returns mapped directories ending in name, looked up by whole path
+        components first, falling back to a plain string suffix scan
+        """
+        name = name.rstrip(os.sep)
+        found: List[str] = self.suffixes.get(name)
+        if found is not None:
+            return list(found)
+        return [i for i in self.paths if i.endswith(name)]
+
+    def refresh(self) -> List[str]:
+        """
+        Re-maps directories below root, reusing cached listings for
+        unchanged directories, then saves the result
+        """
+        try:
+            new_children: Dict[str, Tuple[float, List[str]]] = {}
+            self.walk(self.root, 0, self.children, new_children)
+            self.children = new_children
+            self.paths = list(new_children)
+            self.suffixes = self.index_suffixes(self.paths)
+            self.save()
+        finally:
+            self.refreshed.set()
+        return self.paths
+
+    def refresh_in_background(self, after: Callable = None) -> threading.Thread:
+        """
+        Runs refresh in a daemon thread, so that startup doesn't wait on it,
+        followed by after (for other indexes built alongside the map)
+        """
+
+        def refresh_then_after() -> None:
+            self.refresh()
+            if after is not None:
+                after()
+
+        self.refreshed.clear()
+        self.refresh_thread = threading.Thread(target=refresh_then_after, daemon=True)
+        self.refresh_thread.start()
+        return self.refresh_thread
+
+    def wait(self) -> None:
+        """
+        Blocks until any running background refresh has finished mapping
+        (what runs after it may still be going, see join)
+        """
+        if self.refresh_thread is not None:
+            self.refreshed.wait()
+
+    def join(self) -> None:
+        """
+        Blocks until any background refresh, and whatever it ran after
+        the map, has completely finished
+        """
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+
+
+class Frecency:
+    """
+    Persistent record of how often and how recently directories were
+    visited, used to rank goto matches.
+    """
+
+    def __init__(self, cache_file: str, max_total: int = 10000):
+        self.cache_file: str = cache_file
+        self.max_total: int = max_total
+        self.visits: Dict[str, List[float]] = {}
+
+    @meta_functions.try_else_none
+    def load(self) -> None:
+        """
+        Reads previously saved visits from cache file
+        """
+        with open(self.cache_file, "r") as file:
+            self.visits = json.load(file)
+
+    @meta_functions.try_else_none
+    def save(self) -> None:
+        """
+        Writes visits to cache file
+        """
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temporary_file: str = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(temporary_file, "w") as file:
+            json.dump(self.visits, file)
+        os.replace(temporary_file, self.cache_file)
+
+    def visit(self, path: str) -> None:
+        """
+        Records a visit to path, ageing old entries once the total count
+        gets too large so that stale directories drop out over time
+        """
+        count, _ = self.visits.get(path, (0, 0))
+        self.visits[path] = [count + 1, time.time()]
+        if sum(i[0] for i in self.visits.values()) > self.max_total:
+            self.visits = {
+                k: [v[0] * 0.9, v[1]] for k, v in self.visits.items() if v[0] * 0.9 >= 1
+            }
+        self.save()
+
+    def score(self, path: str) -> float:
+        """
+        Returns visit count weighted by time since last visit
+        """
+        if path not in self.visits:
+            return 0
+        count, last_visit = self.visits[path]
+        age: float = time.time() - last_visit
+        if age < 3600:
+            return count * 4
+        if age < 86400:
+            return count * 2
+        if age < 604800:
+            return count / 2
+        return count / 4
+
+    def matches(self, name: str) -> List[str]:
+        """
+        Returns previously visited directories ending in name, as whole
+        path components (so "src" matches /a/src but not /a/foo_src)
+        """
+        name = name.rstrip(os.sep)
+        ending: str = os.sep + name
+        return [i for i in self.visits if i == name or i.endswith(ending)]
+
+    def forget(self, path: str) -> None:
+        """
+        Drops path (for directories that no longer exist)
+        """
+        if self.visits.pop(path, None) is not None:
+            self.save()
+
+    def rank(self, paths: List[str]) -> List[str]:
+        """
+        Sorts paths by score, then by depth and name so that ties
+        resolve the same way every time
+        """
+        return sorted(
+            set(paths), key=lambda i: (-self.score(i), i.count(os.sep), i)
+        )
+
+
+def trigrams(data: bytes) -> Set[int]:
+    """
+    Returns set of (lower cased) three byte sequences in data, as integers
+    """
+    data = data.lower()
+    return {
+        (a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))
+    }
+
+
+class TrigramIndex:
+    """
+    On-disk inverted index from trigrams to the files containing them,
+    used by search to skip files that can't possibly match.
+
+    Files are re-read only when their mtime changes.
+    """
+
+    def __init__(self, database: str, max_file_size: int = 10 * 1024 * 1024):
+        self.database: str = database
+        self.max_file_size: int = max_file_size
+        self.lock: threading.Lock = threading.Lock()
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Opens connection to the index database (creating tables if needed),
+        committing and closing it when done
+        """
+        os.makedirs(os.path.dirname(self.database), exist_ok=True)
+        connection: sqlite3.Connection = sqlite3.connect(self.database)
+        try:
+            connection.executescript(
+                """
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY);
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL, indexed INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS trigrams (
+                    trigram INTEGER, file INTEGER, PRIMARY KEY (trigram, file)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS trigrams_by_file ON trigrams (file);
+                """
+            )
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def roots(self) -> List[str]:
+        """
+        Returns directories that have been added to the index
+        """
+        if not os.path.exists(self.database):
+            return []
+        with self.connect() as connection:
+            return [i[0] for i in connection.execute("SELECT path FROM roots")]
+
+    def add_root(self, path: str) -> None:
+        """
+        Marks directory as one to keep indexed
+        """
+        with self.connect() as connection:
+            connection.execute("INSERT OR IGNORE INTO roots VALUES (?)", (path,))
+
+    def remove_root(self, path: str) -> None:
+        """
+        Stops indexing directory, and drops its files from the index
+        """
+        with self.lock, self.connect() as connection:
+            connection.execute("DELETE FROM roots WHERE path = ?", (path,))
+            for (file_id,) in connection.execute(
+                "SELECT id FROM files WHERE path LIKE ? ESCAPE '^'",
+                (self.prefix_pattern(path),),
+            ).fetchall():
+                self.forget(connection, file_id)
+
+    def root_of(self, path: str) -> str:
+        """
+        Returns indexed directory containing path (or None)
+        """
+        for root in self.roots():
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def prefix_pattern(self, path: str) -> str:
+        """
+        Returns LIKE pattern matching everything below path
+        """
+        escaped: str = path.replace("^", "^^").replace("%", "^%").replace("_", "^_")
+        return escaped.rstrip(os.sep) + os.sep + "%"
+
+    def forget(self, connection: sqlite3.Connection, file_id: int) -> None:
+        connection.execute("DELETE FROM trigrams WHERE file = ?", (file_id,))
+        connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def read(self, path: str) -> bytes:
+        """
+        Returns contents of file (empty for binary files, so they never
+        match), or None for huge or unreadable files that can't be indexed
+        """
+        try:
+            with open(path, "rb") as file:
+                data: bytes = file.read(self.max_file_size + 1)
+        except OSError:
+            return None
+        if len(data) > self.max_file_size:
+            return None
+        if b"\0" in data[:8192]:
+            return b""
+        return data
+
+    def update(self, directory: str, paths: Iterable[str], depth: int = None) -> None:
+        """
+        Brings index up to date for the files below directory, given
+        every (indexable) path currently below it (or, with depth, every
+        one up to that many folders down, leaving deeper files as they are)
+        """
+        base: int = directory.rstrip(os.sep).count(os.sep)
+        with self.lock, self.connect() as connection:
+            indexed: Dict[str, Tuple[int, float]] = {
+                path: (file_id, mtime)
+                for file_id, path, mtime in connection.execute(
+                    "SELECT id, path, mtime FROM files WHERE path LIKE ? ESCAPE '^'",
+                    (self.prefix_pattern(directory),),
+                )
+            }
+            for path in paths:
+                try:
+                    mtime: float = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                file_id, indexed_mtime = indexed.pop(path, (None, None))
+                if indexed_mtime == mtime:
+                    continue
+                if file_id is not None:
+                    self.forget(connection, file_id)
+                data: bytes = self.read(path)
+                file_id = connection.execute(
+                    "INSERT INTO files (path, mtime, indexed) VALUES (?, ?, ?)",
+                    (path, mtime, data is not None),
+                ).lastrowid
+                if data is not None:
+                    connection.executemany(
+                        "INSERT INTO trigrams VALUES (?, ?)",
+                        ((i, file_id) for i in trigrams(data)),
+                    )
+            # anything left over has been deleted (or is now ignored)
+            for path, (file_id, _) in indexed.items():
+                if depth is None or path.count(os.sep) - base - 1 <= depth:
+                    self.forget(connection, file_id)
+
+    def candidates(self, directory: str, search_string: str) -> List[str]:
+        """
+        Returns files below directory that might contain search_string:
+        those holding all of its trigrams, plus any that couldn't be indexed
+        """
+        # any subset of the trigrams still gives a correct (if looser) filter
+        wanted: List[int] = sorted(trigrams(search_string.encode()))[:200]
+        with self.connect() as connection:
+            query: str = f"""
+                SELECT path FROM files WHERE path LIKE ? ESCAPE '^' AND (
+                    indexed = 0 OR ? = 0 OR id IN (
+                        SELECT file FROM trigrams
+                        WHERE trigram IN ({",".join("?" * len(wanted))})
+                        GROUP BY file HAVING COUNT(*) = ?
+                    )
+                )
+            """
+            return [
+                i[0]
+                for i in connection.execute(
+                    query,
+                    (self.prefix_pattern(directory), len(wanted), *wanted, len(wanted)),
+                )
+            ]
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator
+
+from . import meta_functions
+
+# context used for phases while timing is off (reused, as it does nothing)
+untimed: ContextManager = nullcontext()
+
+
+class CommandTimer:
+    """
+    Records wall time spent in each phase of running a command
+    (classify, execute, print) and the route it took.
+
+    Phases are only timed once start has been called with active, and
+    otherwise share one do-nothing context, so running commands normally
+    costs next to nothing extra.
+    """
+
+    def __init__(self):
+        self.active: bool = False
+        self.started: float = None
+        self.start_time: float = None
+        self.phases: Dict[str, float] = {}
+        self.route: str = None
+        self.cached: bool = None
+
+    def start(self, active: bool) -> None:
+        self.active = active
+        self.started = time.perf_counter()
+        self.start_time = time.time()
+        self.phases = {}
+        self.route = None
+        self.cached = None
+
+    def phase(self, name: str) -> ContextManager:
+        """
+        Times the code inside it as the named phase (when active)
+        """
+        if not self.active:
+            return untimed
+        return self.timed(name)
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def record(self, command: str) -> dict:
+        """
+        Returns timings for the command just run, as written to trace files
+        """
+        return {
+            "time": self.start_time,
+            "command": command,
+            "directory": os.getcwd(),
+            "route": self.route,
+            "cached": self.cached,
+            "phases": self.phases,
+            "total": time.perf_counter() - self.started,
+        }
+
+
+def summary(record: dict) -> str:
+    """
+    Returns one line description of a timing record
+    """
+    route: str = record["route"] or "none"
+    if record["cached"]:
+        route += " (cached)"
+    phases: str = ", ".join(
+        f"{name} {seconds * 1000:.1f} ms" for name, seconds in record["phases"].items()
+    )
+    return f"[italic]{route}: {phases}, total {record['total'] * 1000:.1f} ms[/italic]"
+
+
+@meta_functions.try_else_none
+def append_trace(path: str, record: dict) -> None:
+    """
+    Adds record to the JSON lines trace file at path
+    """
+    with open(os.path.expanduser(path), "a") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+def profile_table(profiler, rows: int = 20) -> "Table":
+    """
+    Returns the rows functions with most cumulative time in profiler
+    (a cProfile.Profile) as a rich table
+    """
+    import pstats
+    from rich.markup import escape
+    from rich.table import Table
+
+    stats: dict = pstats.Stats(profiler).stats
+    ranked: list = sorted(stats.items(), key=lambda i: i[1][3], reverse=True)
+    table: Table = Table(box=None)
+    for column in ("calls", "own ms", "total ms"):
+        table.add_column(column, justify="right")
+    table.add_column("function", style="cyan")
+    for (path, line, function), (_, calls, own, total, _) in ranked[:rows]:
+        # built in functions have no file or line to show
+        name: str = f"{function} ({os.path.basename(path)}:{line})" if line else function
+        table.add_row(
+            str(calls), f"{own * 1000:.1f}", f"{total * 1000:.1f}", escape(name)
+        )
+    return table
@@ -0,0 +1,202 @@
+import asyncio
+import subprocess
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Callable, Coroutine, Dict, List, Type
+
+from . import pipelines
+from .types import FileList
+
+
+class Job:
+    """
+    A command running in the background
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        command: str,
+        future: Future,
+        processes: List[subprocess.Popen] = None,
+    ):
+        self.job_id: int = job_id
+        self.command: str = command
+        self.future: Future = future
+        self.processes: List[subprocess.Popen] = processes or []
+        self.killed: bool = False
+        self.reported: bool = False
+
+    def status(self) -> str:
+        """
+        Returns one of running, done, failed or killed
+        """
+        if not self.future.done():
+            return "running"
+        if self.killed or self.future.cancelled():
+            return "killed"
+        if self.future.exception() is not None:
+            return "failed"
+        return "done"
+
+    def result(self) -> Type:
+        """
+        Returns what the job gave back (or its exception, as clam would show it)
+        """
+        if self.future.cancelled():
+            return None
+        if self.future.exception() is not None:
+            return f"[red bold] ! >> {repr(self.future.exception())}[/red bold]"
+        return self.future.result()
+
+    def describe(self) -> dict:
+        return {"id": str(self.job_id), "status": self.status(), "command": self.command}
+
+
+class JobManager:
+    """
+    Runs background jobs (subprocess pipelines, python code and coroutines)
+    on an asyncio event loop living in its own thread, so the prompt
+    stays responsive while they run.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[int, Job] = {}
+        self.next_id: int = 1
+        self.loop: asyncio.AbstractEventLoop = None
+        self.lock: threading.Lock = threading.Lock()
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Returns event loop, starting it in a daemon thread on first use
+        """
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, daemon=True).start()
+            return self.loop
+
+    def add(
+        self, command: str, coroutine: Coroutine, processes: List[subprocess.Popen] = None
+    ) -> Job:
+        future: Future = asyncio.run_coroutine_threadsafe(coroutine, self.get_loop())
+        with self.lock:
+            job: Job = Job(self.next_id, command, future, processes)
+            self.jobs[job.job_id] = job
+            self.next_id += 1
+        return job
+
+    def start_shell(self, command: str, aliases: Dict[str, str] = None) -> Job:
+        """
+        Starts a shell pipeline in the background (in its own session,
+        so Ctrl-C in the foreground doesn't reach it)
+        """
+        processes: List[subprocess.Popen] = pipelines.start_pipeline(
+            pipelines.resolve_pipeline(pipelines.parse_pipeline(command, aliases)),
+            stdin=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+        async def supervise() -> str:
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            codes: List[int] = [
+                await loop.run_in_executor(None, i.wait) for i in processes
+            ]
+            return f"[italic]output: {codes[-1]}[/italic]"
+
+        return self.add(command, supervise(), processes)
+
+    def start_python(self, command: str, function: Callable) -> Job:
+        """
+        Runs function in a worker thread, awaiting the result
+        if it turns out to be a coroutine
+        """
+
+        async def supervise() -> Type:
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            result: Type = await loop.run_in_executor(None, function)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+
+        return self.add(command, supervise())
+
+    def start_coroutine(self, coroutine: Coroutine, command: str = None) -> Job:
+        return self.add(command or repr(coroutine), coroutine)
+
+    def get(self, job_id: int = None) -> Job:
+        """
+        Returns job by id (or the most recent one)
+        """
+        assert len(self.jobs) > 0, "No jobs"
+        if job_id is None:
+            job_id = max(self.jobs)
+        assert int(job_id) in self.jobs, f"No job {job_id}"
+        return self.jobs[int(job_id)]
+
+    def finished(self) -> List[Job]:
+        """
+        Returns jobs that have finished since last asked,
+        dropping them from the job list
+        """
+        with self.lock:
+            done: List[Job] = [
+                i for i in self.jobs.values() if i.future.done() and not i.reported
+            ]
+            for job in done:
+                job.reported = True
+                del self.jobs[job.job_id]
+        return done
+
+    def kill(self, job_id: int = None) -> str:
+        job: Job = self.get(job_id)
+        job.killed = True
+        for process in job.processes:
+            if process.poll() is None:
+                process.terminate()
+        if not job.processes:
+            # coroutines stop here, but python already running in a worker
+            # thread can't be interrupted, so only its result is discarded
+            job.future.cancel()
+        return f"[green]killed job {job.job_id}[/green]"
+
+
+job_manager: JobManager = JobManager()
+
+
+def jobs() -> FileList:
+    return FileList(i.describe() for i in job_manager.jobs.values())
+
+
+def fg(job_id: int = None) -> Type:
+    job: Job = job_manager.get(job_id)
+    # Ctrl-C here goes back to the prompt, leaving the job running
+    try:
+        job.future.result()
+    except (Exception, CancelledError):
+        pass
+    job.reported = True
+    job_manager.jobs.pop(job.job_id, None)
+    return job.result()
+
+
+def wait(job_id: int = None) -> Type:
+    if job_id is not None:
+        return fg(job_id)
+    waiting_on: List[Job] = list(job_manager.jobs.values())
+    for job in waiting_on:
+        try:
+            job.future.result()
+        except (Exception, CancelledError):
+            pass
+    return f"[green]{len(waiting_on)} jobs finished[/green]"
+
+
+def kill_job(job_id: int = None) -> str:
+    # not kill, which would hide the kill command for sending signals to pids
+    return job_manager.kill(job_id)
+
+
+def background(coroutine: Coroutine) -> str:
+    job: Job = job_manager.start_coroutine(coroutine)
+    return f"[italic][{job.job_id}] started[/italic]"
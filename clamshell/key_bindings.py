@@ -6,5 +6,12 @@ key_bindings: KeyBindings = KeyBindings()
 
 @key_bindings.add(Keys.Tab)
 def _(event) -> None:
-    before_cursor = event.app.current_buffer.document.current_line_before_cursor
-    event.app.current_buffer.insert_text(" " * (4 - len(before_cursor) % 4))
+    buffer = event.app.current_buffer
+    before_cursor = buffer.document.current_line_before_cursor
+    # indent at the start of a line, otherwise complete
+    if before_cursor.strip() == "":
+        buffer.insert_text(" " * (4 - len(before_cursor) % 4))
+    elif buffer.complete_state:
+        buffer.complete_next()
+    else:
+        buffer.start_completion(select_first=False)
@@ -41,6 +41,10 @@ def coerce(value: Type, default: Type) -> Type:
     return default
 
 
+# start of the strings errors are returned as
+error_prefix: str = "[red bold] ! >>"
+
+
 def capture_and_return_exception(function: Type) -> Type:
     """
     Wraps the given function to return exception as string
@@ -50,5 +54,13 @@ def capture_and_return_exception(function: Type) -> Type:
         try:
             return function(*args, **kwargs)
         except Exception as exception:
-            return f"[red bold] ! >> {str(repr(exception))}[/red bold]"
+            return f"{error_prefix} {str(repr(exception))}[/red bold]"
     return new_function
+
+
+def is_error(output: Type) -> bool:
+    """
+    Returns true if output is an error returned by a function
+    wrapped in capture_and_return_exception
+    """
+    return isinstance(output, str) and output.startswith(error_prefix)
@@ -0,0 +1,327 @@
+import os
+import shlex
+import shutil
+import subprocess
+from collections import deque
+from collections.abc import Iterator as IteratorType
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Type
+
+
+class CommandNotFoundError(Exception):
+    pass
+
+
+class Stage(NamedTuple):
+    """
+    One command in a pipeline, with any file redirections
+    """
+
+    arguments: List[str]
+    stdin: str = None
+    stdout: str = None
+    append: bool = False
+    executable: str = None
+
+
+class CommandTable:
+    """
+    Remembers where executables were found on $PATH (like bash's hash),
+    so each command is only searched for once. Entries are dropped when
+    $PATH changes, when the file disappears, or on rehash.
+    """
+
+    def __init__(self):
+        self.paths: Dict[str, str] = {}
+        self.path_variable: str = os.environ.get("PATH")
+        self.generation: int = 0
+
+    def resolve(self, name: str) -> str:
+        """
+        Returns full path of executable name (or None if there isn't one)
+        """
+        if os.environ.get("PATH") != self.path_variable:
+            self.rehash()
+        found: str = self.paths.get(name)
+        if found is not None and os.path.isfile(found):
+            return found
+        found = shutil.which(name)
+        if found is None:
+            self.paths.pop(name, None)
+        elif os.sep not in name:
+            self.paths[name] = found
+        return found
+
+    def rehash(self) -> None:
+        """
+        Forgets every remembered location
+        """
+        self.paths = {}
+        self.path_variable = os.environ.get("PATH")
+        self.generation += 1
+
+
+command_table: CommandTable = CommandTable()
+# first word that runs the rest of a stage as an executable, skipping
+# aliases (and, at the prompt, clamshell's own time and profile prefixes)
+external_prefix: str = "command"
+
+
+def split_command(command: str) -> List[str]:
+    """
+    Splits a command line into words, with |, <, > and >> as their own words
+    """
+    lexer: shlex.shlex = shlex.shlex(
+        command, posix=os.name != "nt", punctuation_chars="|<>"
+    )
+    lexer.whitespace_split = True
+    return list(lexer)
+
+
+def uses_descriptor_redirects(words: List[str]) -> bool:
+    """
+    Returns whether split words redirect by file descriptor (2>, 2>&1,
+    &>, >&2 and so on). Split words can't tell "echo 2 > out" from
+    "echo 2>out", so both count.
+    """
+    for i, word in enumerate(words):
+        if word not in ("<", ">", ">>"):
+            continue
+        before: str = words[i - 1] if i > 0 else ""
+        after: str = words[i + 1] if i + 1 < len(words) else ""
+        if before == "&" or before.isdigit() or after.startswith("&"):
+            return True
+    return False
+
+
+def system_shell(command: str) -> List[str]:
+    """
+    Returns arguments running command with the system shell
+    """
+    if os.name == "nt":
+        return ["cmd", "/c", command]
+    return [shutil.which("bash") or "/bin/sh", "-c", command]
+
+
+def parse_pipeline(command: str, aliases: Dict[str, str] = None) -> List[Stage]:
+    """
+    Parses a command line into stages joined by |, picking out
+    <, > and >> redirections, and expanding aliases (matched against
+    the whole first word of each stage, and each expanded only once,
+    unless the stage starts with "command", which is dropped instead).
+    Command lines redirecting by file descriptor (like 2>&1) are handed
+    whole to the system shell instead, as one stage (without aliases).
+    """
+    aliases = aliases or {}
+    stages: List[Stage] = []
+    arguments: List[str] = []
+    redirects: dict = {}
+    expanded: set = set()
+    words: deque = deque(split_command(command))
+    if uses_descriptor_redirects(words):
+        return [Stage(system_shell(command))]
+    while words:
+        word: str = words.popleft()
+        if word == "|":
+            assert len(arguments) > 0, "Empty command in pipeline"
+            stages.append(Stage(arguments, **redirects))
+            arguments, redirects, expanded = [], {}, set()
+        elif word in ("<", ">", ">>"):
+            target: str = words.popleft() if words else None
+            assert target not in (None, "|", "<", ">", ">>"), f"No file given after {word}"
+            if word == "<":
+                redirects["stdin"] = target
+            else:
+                redirects["stdout"] = target
+                redirects["append"] = word == ">>"
+        elif len(arguments) == 0 and word == external_prefix and words:
+            expanded.update(aliases)
+        elif len(arguments) == 0 and word in aliases and word not in expanded:
+            expanded.add(word)
+            words.extendleft(reversed(split_command(aliases[word])))
+        else:
+            arguments.append(word)
+    assert len(arguments) > 0, "Empty command in pipeline"
+    stages.append(Stage(arguments, **redirects))
+    return stages
+
+
+def resolve_pipeline(stages: List[Stage]) -> List[Stage]:
+    """
+    Looks up each stage's executable in the command table
+    """
+    resolved: List[Stage] = []
+    for stage in stages:
+        executable: str = command_table.resolve(stage.arguments[0])
+        if executable is None:
+            raise CommandNotFoundError(f"command not found: {stage.arguments[0]}")
+        resolved.append(stage._replace(executable=executable))
+    return resolved
+
+
+def start_pipeline(
+    stages: List[Stage], stdout=None, stdin=None, **options
+) -> List[subprocess.Popen]:
+    """
+    Starts every stage, connecting each one's stdout to the next one's
+    stdin with an OS pipe, so data never passes through python.
+    stdin and stdout are used for the first and last stages, unless
+    redirected to files, and options are passed on to every Popen.
+    """
+    processes: List[subprocess.Popen] = []
+    previous: subprocess.Popen = None
+    try:
+        for i, stage in enumerate(stages):
+            last: bool = i == len(stages) - 1
+            # the child gets its own copies of these, closing ours lets
+            # earlier stages see a broken pipe if later ones exit
+            to_close: list = []
+            stage_stdin = stdin
+            if previous is not None:
+                stage_stdin = previous.stdout
+                to_close.append(previous.stdout)
+            if stage.stdin is not None:
+                stage_stdin = open(stage.stdin, "rb")
+                to_close.append(stage_stdin)
+            stage_stdout = stdout if last else subprocess.PIPE
+            if stage.stdout is not None:
+                stage_stdout = open(stage.stdout, "ab" if stage.append else "wb")
+                to_close.append(stage_stdout)
+            try:
+                process: subprocess.Popen = subprocess.Popen(
+                    stage.arguments,
+                    executable=stage.executable,
+                    stdin=stage_stdin,
+                    stdout=stage_stdout,
+                    **options,
+                )
+            finally:
+                for handle in to_close:
+                    handle.close()
+            processes.append(process)
+            previous = process
+    except BaseException:
+        stop_pipeline(processes)
+        raise
+    return processes
+
+
+def stop_pipeline(processes: List[subprocess.Popen]) -> None:
+    """
+    Terminates any stages still running, and waits for them all
+    """
+    for process in processes:
+        if process.stdout is not None:
+            process.stdout.close()
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+
+
+def run_pipeline(command: str, aliases: Dict[str, str] = None) -> int:
+    """
+    Runs a command line (with pipes and redirection) attached to
+    the terminal, returning the last stage's exit code
+    """
+    processes: List[subprocess.Popen] = start_pipeline(
+        resolve_pipeline(parse_pipeline(command, aliases))
+    )
+    return [i.wait() for i in processes][-1]
+
+
+def stream_pipeline(command: str) -> Iterator[str]:
+    """
+    Runs a command line, yielding lines of its output as they're written.
+    Closing the iterator early stops the pipeline.
+    """
+    processes: List[subprocess.Popen] = start_pipeline(
+        resolve_pipeline(parse_pipeline(command)), stdout=subprocess.PIPE
+    )
+    finished: bool = False
+    try:
+        for line in processes[-1].stdout:
+            yield line.decode(errors="replace").rstrip("\r\n")
+        finished = True
+    finally:
+        if finished:
+            for process in processes:
+                process.wait()
+        stop_pipeline(processes)
+
+
+def pipe_into(command: str, function: Callable) -> int:
+    """
+    Calls function with each line of a command line's output,
+    returning the last stage's exit code
+    """
+    processes: List[subprocess.Popen] = start_pipeline(
+        resolve_pipeline(parse_pipeline(command)), stdout=subprocess.PIPE
+    )
+    try:
+        for line in processes[-1].stdout:
+            function(line.decode(errors="replace").rstrip("\r\n"))
+        for process in processes:
+            process.wait()
+    finally:
+        stop_pipeline(processes)
+    return processes[-1].returncode
+
+
+def map_stage(
+    function: Callable, items: Iterable, executor: Executor = None, buffer: int = 64
+) -> Iterator:
+    """
+    Lazily applies function to each item, dropping items it returns None for.
+    With an executor, up to buffer items are worked on at once (in order).
+    """
+    if executor is None:
+        results: Iterable = (function(i) for i in items)
+    else:
+        results = bounded_map(executor, function, items, buffer)
+    return (i for i in results if i is not None)
+
+
+def bounded_map(
+    executor: Executor, function: Callable, items: Iterable, buffer: int
+) -> Iterator:
+    """
+    Like executor.map, but only reads ahead buffer items rather than
+    submitting everything up front
+    """
+    pending: deque = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= buffer:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def stream_stages(
+    value: Type,
+    stages: List[Callable],
+    workers: int = 0,
+    processes: bool = False,
+    buffer: int = 64,
+) -> Iterator:
+    """
+    Passes value through each stage. Stages are called with the whole value
+    until one produces an iterator, then every later stage is called on
+    each item as it flows through, so memory use stays flat.
+    """
+    executor: Executor = None
+    if workers:
+        pool: Type = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        executor = pool(max_workers=workers)
+    try:
+        stages = list(stages)
+        while stages and not isinstance(value, IteratorType):
+            value = stages.pop(0)(value)
+        if not isinstance(value, IteratorType):
+            value = iter([value])
+        for stage in stages:
+            value = map_stage(stage, value, executor, buffer)
+        yield from value
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
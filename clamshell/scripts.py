@@ -0,0 +1,191 @@
+"""
+Runs clam scripts (files, or stdin) line by line through the same
+dispatcher as the prompt, without prompt_toolkit.
+
+How each command runs (and its compiled code) is cached next to the
+script, in __pycache__, so unchanged scripts skip splitting and
+compiling their commands on later runs.
+"""
+import os
+import re
+import sys
+import marshal
+import hashlib
+from typing import Dict, List, Pattern, Tuple
+
+from . import job_control, meta_functions
+from .types import Dispatch
+
+# bumped whenever what's cached (or how it's used) changes
+cache_version: int = 1
+# lines that carry on a block without being indented
+block_continuation_pattern: Pattern = re.compile(r"^(elif|else|except|finally)\b")
+
+
+def script_argument() -> str:
+    """
+    Returns the script to run: the first command line argument (unless
+    it's a flag, and "-" for stdin), or "-" if stdin isn't a terminal
+    and there are no arguments, otherwise None to run interactively
+    """
+    if len(sys.argv) > 1:
+        return None if sys.argv[1].startswith("--") else sys.argv[1]
+    if not sys.stdin.isatty():
+        return "-"
+    return None
+
+
+def split_commands(shell, text: str) -> List[str]:
+    """
+    Splits a script into commands, as they'd be typed at the prompt:
+    a line, plus following lines while brackets or quotes are unclosed,
+    or (after a colon) while they're indented. Blank lines and
+    comments between commands are skipped.
+    """
+    lines: List[str] = text.splitlines()
+    commands: List[str] = []
+    index: int = 0
+    while index < len(lines):
+        command: str = lines[index]
+        index += 1
+        if command.strip() == "" or command.lstrip().startswith("#"):
+            continue
+        block: bool = command.rstrip().endswith(":")
+        while index < len(lines):
+            following: str = lines[index]
+            continues_block: bool = block and (
+                following.strip() == ""
+                or following[:1].isspace()
+                or block_continuation_pattern.match(following) is not None
+            )
+            if not (continues_block or shell.is_uncompleted(command)):
+                break
+            command += f"\n{following}"
+            index += 1
+        commands.append(command.rstrip())
+    return commands
+
+
+def cache_path(path: str) -> str:
+    """
+    Returns where the cache for the script at path is kept
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(
+        directory, "__pycache__", f"{name}.{sys.implementation.cache_tag}.clamc"
+    )
+
+
+def environment(shell) -> Tuple:
+    # the cached dispatch is only reused for the same commands and $PATH
+    return (
+        list(shell.super_commands),
+        sorted(shell.aliases.items()),
+        os.environ.get("PATH"),
+    )
+
+
+@meta_functions.try_else_none
+def load_cache(path: str, digest: str) -> dict:
+    """
+    Returns the cache for the script at path, if it was for this
+    version of the script (digest is the hash of its contents)
+    """
+    with open(cache_path(path), "rb") as file:
+        cache: dict = marshal.load(file)
+    if cache["version"] != cache_version or cache["digest"] != digest:
+        return None
+    return cache
+
+
+@meta_functions.try_else_none
+def save_cache(path: str, cache: dict) -> None:
+    """
+    Writes cache for the script at path (if the folder it's in can be written to)
+    """
+    file_path: str = cache_path(path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temporary_file: str = f"{file_path}.{os.getpid()}.tmp"
+    with open(temporary_file, "wb") as file:
+        marshal.dump(cache, file)
+    os.replace(temporary_file, file_path)
+
+
+def seed_dispatch_cache(shell, dispatches: Dict[str, tuple]) -> None:
+    """
+    Fills the shell's dispatch cache from a script's cache. Entries are
+    still checked against the names they looked up before use, as if
+    they'd been classified earlier in the session (so shell or missing
+    commands are looked up again whenever they're run).
+    """
+    state: tuple = shell.dispatch_state()
+    for command, (route, code, lookups) in dispatches.items():
+        shell.dispatch_cache[command] = (Dispatch(route, code), lookups, state)
+
+
+def cacheable_dispatches(shell) -> Dict[str, tuple]:
+    return {
+        command: (dispatch.route, dispatch.code, lookups)
+        for command, (dispatch, lookups, _) in shell.dispatch_cache.items()
+    }
+
+
+def run_script(shell, path: str) -> int:
+    """
+    Runs the clam script at path ("-" for stdin) command by command,
+    printing output as at the prompt, and returns the status of the
+    last command (like sh, carrying on after ones that fail)
+    """
+    if path == "-":
+        source: bytes = sys.stdin.buffer.read()
+    else:
+        with open(path, "rb") as file:
+            source = file.read()
+    digest: str = hashlib.sha256(source).hexdigest()
+    started_in: Tuple = environment(shell)
+    cache: dict = None if path == "-" else load_cache(path, digest)
+    if cache is not None and cache["environment"] != started_in:
+        cache["dispatches"] = {}
+    if cache is None:
+        commands: List[str] = split_commands(shell, source.decode(errors="replace"))
+        cache = {"dispatches": {}}
+    else:
+        commands = cache["commands"]
+    # show whole outputs, as there's no page to see the rest with
+    shell.max_rows = sys.maxsize
+    shell.dispatch_cache_size = max(shell.dispatch_cache_size, len(commands))
+    seed_dispatch_cache(shell, cache["dispatches"])
+    try:
+        for command in commands:
+            shell.run_command(command)
+            shell.report_finished_jobs()
+        job_control.wait()
+        shell.report_finished_jobs()
+    except KeyboardInterrupt:
+        return 130
+    dispatches: Dict[str, tuple] = cacheable_dispatches(shell)
+    if path != "-" and dispatches != cache["dispatches"]:
+        save_cache(
+            path,
+            {
+                "version": cache_version,
+                "digest": digest,
+                "environment": started_in,
+                "commands": commands,
+                "dispatches": dispatches,
+            },
+        )
+    return shell.status
+
+
+def run_if_given(shell) -> None:
+    """
+    Runs the script given on the command line (or piped in), if there
+    is one, then exits with its status
+    """
+    path: str = script_argument()
+    if path is None:
+        return
+    # the script sees itself and its own arguments in sys.argv
+    sys.argv = sys.argv[1:] or ["-"]
+    sys.exit(run_script(shell, path))
@@ -0,0 +1,138 @@
+import os
+import re
+import mmap
+import signal
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Iterable, Iterator, List, Pattern, Tuple
+
+# files bigger than this are memory mapped rather than read in
+mmap_threshold: int = 1024 * 1024
+# number of bytes checked for null characters when detecting binary files
+binary_check_size: int = 8192
+# below this many files, a process pool costs more than it saves
+parallel_threshold: int = 64
+# number of files handed to a worker process at a time
+batch_size: int = 16
+
+
+def compile_pattern(
+    search_string: str, regex: bool = False, ignore_case: bool = False
+) -> Pattern:
+    """
+    Compiles search string into a bytes pattern (escaping it unless regex)
+    """
+    source: bytes = search_string.encode()
+    if not regex:
+        source = re.escape(source)
+    flags: int = re.MULTILINE
+    if ignore_case:
+        flags |= re.IGNORECASE
+    return re.compile(source, flags)
+
+
+def is_binary(data) -> bool:
+    """
+    Returns true if the start of data contains a null byte
+    """
+    return b"\0" in data[:binary_check_size]
+
+
+def line_matches(data, pattern: Pattern) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (line_number, line) for each line in data matching pattern,
+    scanning the whole buffer with the regex engine instead of line by line
+    """
+    line_number: int = 0
+    counted_up_to: int = 0
+    match = pattern.search(data)
+    while match is not None:
+        start: int = data.rfind(b"\n", 0, match.start()) + 1
+        end: int = data.find(b"\n", match.end())
+        if end == -1:
+            end = len(data)
+        line_number += data.count(b"\n", counted_up_to, start)
+        counted_up_to = start
+        yield line_number, data[start:end].decode(errors="replace").rstrip("\r")
+        if end >= len(data):
+            return
+        match = pattern.search(data, end + 1)
+
+
+def search_file(
+    path: str, pattern: Pattern, files_only: bool = False
+) -> List[Tuple[int, str]]:
+    """
+    Returns matching lines in file at path, skipping binary
+    and unreadable files (or just the first match if files_only)
+    """
+    try:
+        with open(path, "rb") as file:
+            size: int = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return []
+            if size < mmap_threshold:
+                data = file.read()
+                if is_binary(data):
+                    return []
+                return list(islice(line_matches(data, pattern), 1 if files_only else None))
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if is_binary(data):
+                    return []
+                return list(islice(line_matches(data, pattern), 1 if files_only else None))
+    except (OSError, ValueError):
+        return []
+
+
+def search_batch(
+    paths: List[str], pattern: Pattern, files_only: bool = False
+) -> List[Tuple[str, List[Tuple[int, str]]]]:
+    """
+    Searches a batch of files, returning (path, matching lines) for each
+    """
+    return [(path, search_file(path, pattern, files_only)) for path in paths]
+
+
+def ignore_interrupts() -> None:
+    """
+    Stops worker processes dying on Ctrl-C, so the shell can stop the
+    search cleanly instead
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def search_files(
+    paths: Iterable[str], pattern: Pattern, files_only: bool = False
+) -> Iterator[Tuple[str, List[Tuple[int, str]]]]:
+    """
+    Yields (path, matching lines) for each path as soon as it has been
+    searched, spreading the work over a process pool when there are enough
+    files to make it worthwhile. Closing the iterator stops the search.
+    """
+    paths = iter(paths)
+    first: List[str] = list(islice(paths, parallel_threshold))
+    if len(first) < parallel_threshold:
+        for path in first:
+            yield path, search_file(path, pattern, files_only)
+        return
+    batches: Iterator[List[str]] = iter(
+        lambda: list(islice(paths, batch_size)), []
+    )
+    executor: ProcessPoolExecutor = ProcessPoolExecutor(initializer=ignore_interrupts)
+    max_pending: int = (os.cpu_count() or 1) * 4
+    pending: set = set()
+    try:
+        for i in range(0, len(first), batch_size):
+            pending.add(
+                executor.submit(search_batch, first[i : i + batch_size], pattern, files_only)
+            )
+        while pending:
+            for batch in islice(batches, max_pending - len(pending)):
+                pending.add(executor.submit(search_batch, batch, pattern, files_only))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,251 @@
+"""
+Optional warm server: a clamshell process that has already done its imports,
+loaded clamrc and mapped directories, and forks a new session for each
+terminal that connects, so new shells start almost instantly.
+
+Only light modules are imported here, as the client side runs before
+anything else at startup.
+"""
+import os
+import sys
+import json
+import socket
+from typing import Callable
+
+def socket_path() -> str:
+    home: str = os.environ.get("HOME", os.path.expanduser("~"))
+    return os.path.join(home, ".config", "clamshell", "server.sock")
+
+
+def supported() -> bool:
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX") and hasattr(socket, "send_fds")
+
+
+def connect() -> socket.socket:
+    """
+    Returns connection to a running server (or None if there isn't one)
+    """
+    if not supported() or not os.path.exists(socket_path()):
+        return None
+    connection: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path())
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def send_message(connection: socket.socket, message: dict) -> None:
+    connection.sendall(json.dumps(message).encode() + b"\n")
+
+
+def receive_message(connection: socket.socket) -> dict:
+    with connection.makefile("rb") as reader:
+        return json.loads(reader.readline() or b"{}")
+
+
+def attach_if_running() -> None:
+    """
+    Runs this terminal's session in a running server, then exits with its
+    status (or for --stop-server, stops the server and exits). Returns, to
+    carry on starting up in-process, if there's no server, this isn't a
+    terminal, or there are any other arguments (like --server or --no-server).
+    """
+    if "--stop-server" in sys.argv:
+        print(stop())
+        sys.exit(0)
+    if len(sys.argv) > 1:
+        return
+    if not (sys.stdin.isatty() and sys.stdout.isatty()):
+        return
+    connection: socket.socket = connect()
+    if connection is None:
+        return
+    with connection:
+        send_message(connection, {"cwd": os.getcwd(), "environ": dict(os.environ)})
+        try:
+            _, fds, _, _ = socket.recv_fds(connection, 16, 1)
+        except OSError:
+            return
+        if not fds:
+            return
+        relay(fds[0])
+        status: bytes = connection.recv(16)
+    sys.exit(int(status or 0))
+
+
+def relay(master: int) -> None:
+    """
+    Passes bytes between this terminal (in raw mode) and the session's
+    pseudo-terminal until the session ends, keeping its size in step
+    """
+    import tty
+    import fcntl
+    import select
+    import signal
+    import termios
+
+    stdin: int = sys.stdin.fileno()
+    stdout: int = sys.stdout.fileno()
+
+    def resize(*_) -> None:
+        size: bytes = fcntl.ioctl(stdin, termios.TIOCGWINSZ, b"\0" * 8)
+        fcntl.ioctl(master, termios.TIOCSWINSZ, size)
+
+    resize()
+    previous_handler = signal.signal(signal.SIGWINCH, resize)
+    saved: list = termios.tcgetattr(stdin)
+    tty.setraw(stdin)
+    reading: list = [stdin, master]
+    try:
+        while True:
+            readable, _, _ = select.select(reading, [], [])
+            if stdin in readable:
+                data: bytes = os.read(stdin, 65536)
+                if data:
+                    write_all(master, data)
+                else:
+                    reading.remove(stdin)
+            if master in readable:
+                try:
+                    data = os.read(master, 65536)
+                except OSError:
+                    # EIO once everything in the session has closed the terminal
+                    break
+                if not data:
+                    break
+                write_all(stdout, data)
+    finally:
+        termios.tcsetattr(stdin, termios.TCSADRAIN, saved)
+        signal.signal(signal.SIGWINCH, previous_handler)
+        os.close(master)
+
+
+def write_all(fd: int, data: bytes) -> None:
+    while data:
+        data = data[os.write(fd, data) :]
+
+
+def stop() -> str:
+    connection: socket.socket = connect()
+    if connection is None:
+        return "no clamshell server running"
+    with connection:
+        send_message(connection, {"stop": True})
+        connection.recv(16)
+    return "clamshell server stopped"
+
+
+def serve_if_asked(shell, run: Callable[[], None]) -> None:
+    """
+    For --server, starts serving sessions in the background and exits.
+    shell is the warmed up ClamShell and run its read-evaluate-print loop.
+    """
+    if "--server" not in sys.argv:
+        return
+    if not supported():
+        sys.exit("a clamshell server needs a unix-like os")
+    if connect() is not None:
+        sys.exit(f"a clamshell server is already running ({socket_path()})")
+    from . import shell_utils
+
+    # forking with these threads mid-way through would leave them broken
+    shell.lexer_thread.join()
+    shell_utils.directory_map.join()
+    shell.history.close()
+    shell.history = None
+    if os.fork() > 0:
+        print(f"clamshell server listening on {socket_path()}")
+        sys.exit(0)
+    os.setsid()
+    null: int = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(null, fd)
+    os.close(null)
+    serve(shell, run)
+    sys.exit(0)
+
+
+def serve(shell, run: Callable[[], None]) -> None:
+    import signal
+
+    if os.path.exists(socket_path()):
+        os.unlink(socket_path())
+    listener: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path())
+    os.chmod(socket_path(), 0o600)
+    listener.listen()
+    # sessions are never waited on, so let them be reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    try:
+        while True:
+            connection, _ = listener.accept()
+            with connection:
+                if not same_user(connection):
+                    continue
+                request: dict = receive_message(connection)
+                if request.get("stop"):
+                    connection.sendall(b"0")
+                    return
+                if os.fork() == 0:
+                    listener.close()
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    run_session(shell, run, connection, request)
+    finally:
+        listener.close()
+        if os.path.exists(socket_path()):
+            os.unlink(socket_path())
+
+
+def same_user(connection: socket.socket) -> bool:
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    import struct
+
+    credentials: bytes = connection.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    return struct.unpack("3i", credentials)[1] == os.getuid()
+
+
+def run_session(shell, run: Callable[[], None], connection: socket.socket, request: dict) -> None:
+    """
+    Runs in the forked child: makes a new pseudo-terminal its controlling
+    terminal, hands the other end to the client, takes on the client's
+    directory and environment, and runs the shell until it exits
+    """
+    import fcntl
+    import termios
+
+    from . import shell_utils
+
+    status: int = 0
+    try:
+        master, slave = os.openpty()
+        os.setsid()
+        fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+        for fd in (0, 1, 2):
+            os.dup2(slave, fd)
+        os.close(slave)
+        socket.send_fds(connection, [b"\0"], [master])
+        os.close(master)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["environ"])
+        # pick up visits and folders from sessions since the server started
+        shell_utils.frecency.load()
+        shell_utils.directory_map.refresh_in_background(after=shell_utils.refresh_search_index)
+        shell.start_session()
+        run()
+    except SystemExit as exit:
+        status = exit.code if isinstance(exit.code, int) else 0
+    except BaseException:
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            connection.sendall(str(status).encode())
+        finally:
+            os._exit(status)
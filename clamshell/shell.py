@@ -1,22 +1,39 @@
-import subprocess
 import os
+import re
+import ast
+import asyncio
+import shutil
+import builtins
 import threading
-from collections import defaultdict
-from typing import Callable, List, Dict, Type
-
-from pygments.lexers.python import PythonLexer
-from rich.table import Table
-from prompt_toolkit.key_binding import KeyBindings
-from prompt_toolkit import prompt, PromptSession
-from prompt_toolkit.lexers import PygmentsLexer
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.history import FileHistory
+import types
+from functools import lru_cache
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
+from typing import Callable, List, Dict, Pattern, Tuple, Type
+
 from rich import print
-from prompt_toolkit.output.color_depth import ColorDepth
+from rich.markup import escape
+
+from . import meta_functions, defaults, instrumentation, job_control, pipelines, shell_utils
+from .types import Dispatch, FileList, FileText, format_value
+
+
+# first words that look like a command name rather than a python expression
+command_word_pattern: Pattern = re.compile(r"^[\w./~-]+$")
+# commands run with timing (time <command>) or profiling (profile <command>)
+instrumented_pattern: Pattern = re.compile(r"^\s*(time|profile)\s+(\S.*)$", re.DOTALL)
+
 
-from . import meta_functions, defaults, shell_utils
-from .key_bindings import key_bindings
-from .types import FileList
+@lru_cache(maxsize=None)
+def splitter_pattern(splitters: Tuple[str, ...]) -> Pattern:
+    """
+    Returns regex matching a piece of a command: a quoted section
+    (for each quote character) or a run of anything but the separator
+    """
+    separator, *quotes = [re.escape(i) for i in splitters]
+    return re.compile(
+        "|".join([f"{i}[^{i}]*{i}?" for i in quotes] + [f"[^{separator}]+"])
+    )
 
 
 class ClamShell:
@@ -32,33 +49,114 @@ class ClamShell:
         get_continuation_prompt: callable = defaults.get_continuation_prompt,
         shell_globals: dict = None,
         shell_locals: dict = None,
+        interactive: bool = True,
     ):
         self.super_commands: List[str] = meta_functions.coerce(super_commands, [])
-        self.aliases: Dict[str, str] = meta_functions.coerce(aliases, [])
-        self.lexer: PygmentsLexer = PygmentsLexer(PythonLexer)
+        self.aliases: Dict[str, str] = meta_functions.coerce(aliases, {})
         self.globals: dict = meta_functions.coerce(shell_globals, globals())
         self.locals: list = meta_functions.coerce(shell_locals, locals())
-        history_file: str = self.history_file()
-        self.session: PromptSession = PromptSession(history=FileHistory(history_file))
-        self.key_bindings: KeyBindings = key_bindings
+        self.lexer: "Lexer" = None
+        self.lexer_thread: threading.Thread = None
+        self.key_bindings: "KeyBindings" = None
+        self.history: "SQLiteHistory" = None
+        self.session: "PromptSession" = None
+        self.prompt_loop: asyncio.AbstractEventLoop = None
+        # scripts run without a prompt, so skip prompt_toolkit altogether
+        if interactive:
+            self.start_session()
         self.get_prompt: Callable = get_prompt
         self.get_continuation_prompt: Callable = get_continuation_prompt
         self.command: str = None
         self.output: Type = None
+        self.dispatch_cache: OrderedDict = OrderedDict()
+        self.dispatch_cache_size: int = 256
+        self.lookups: Dict[str, bool] = None
+        self.max_rows: int = None
+        self.max_items: int = 1000
+        self.sample_size: int = 200
+        self.truncated_output: FileList = None
+        self.max_text_lines: int = 1000
+        self.timer: instrumentation.CommandTimer = instrumentation.CommandTimer()
+        self.show_timings: bool = False
+        self.trace_file: str = None
+        self.profile_rows: int = 20
+        self.status: int = 0
+
+    def start_session(self) -> None:
+        """
+        Opens history and builds the prompt session on the current terminal
+        (done again in each session forked from a clamshell server, as
+        neither the database connection nor the terminal carry over)
+        """
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.lexers import DynamicLexer, SimpleLexer
+        from prompt_toolkit.output.color_depth import ColorDepth
+
+        from .completion import ClamCompleter
+        from .history import HistoryAutoSuggest, SQLiteHistory
+        from .key_bindings import key_bindings
+
+        if self.lexer_thread is None:
+            self.lexer = SimpleLexer()
+            self.lexer_thread = threading.Thread(target=self.load_lexer, daemon=True)
+            self.lexer_thread.start()
+            self.key_bindings = key_bindings
+        if self.history is not None:
+            self.history.close()
+        self.history = SQLiteHistory(
+            self.history_database(), import_file=self.history_file()
+        )
+        self.session = PromptSession(
+            history=self.history,
+            lexer=DynamicLexer(lambda: self.lexer),
+            auto_suggest=HistoryAutoSuggest(self.history),
+            completer=ClamCompleter(
+                lambda: (self.locals, self.globals),
+                lambda: list(self.aliases) + self.super_commands,
+                shell_utils.complete_directory,
+            ),
+            complete_in_thread=True,
+            key_bindings=self.key_bindings,
+            color_depth=ColorDepth.ANSI_COLORS_ONLY,
+        )
+        # threads don't survive a fork, so the prompt loop is started afresh
+        self.prompt_loop = None
+
+    def load_lexer(self) -> None:
+        """
+        Builds the python syntax highlighter (slow to import and compile,
+        so it's done in the background while the first prompt shows)
+        """
+        from pygments.lexers.python import PythonLexer
+        from prompt_toolkit.lexers import PygmentsLexer
+
+        self.lexer = PygmentsLexer(PythonLexer)
 
     def history_file(self) -> str:
         """
-        Infers and returns location of history file
+        Infers and returns location of (older, plain text) history file
         """
         home: str = shell_utils.home
         splitter: str = shell_utils.splitter
         history_file: str = (
             f"{home}{splitter}.config{splitter}clamshell{splitter}history"
         )
-        if not os.path.exists(history_file):
-            shell_utils.make_file(history_file)
         return history_file
 
+    def history_database(self) -> str:
+        """
+        Infers and returns location of history database
+        """
+        home: str = shell_utils.home
+        splitter: str = shell_utils.splitter
+        return f"{home}{splitter}.config{splitter}clamshell{splitter}history.sqlite"
+
+    def search_history(self, text: str = "", limit: int = 50) -> FileList:
+        """
+        Returns past commands containing text
+        """
+        return self.history.search(text, limit)
+
     def rc_file(self) -> str:
         """
         Infers and returns location of clamrc file
@@ -92,15 +190,70 @@ class ClamShell:
         completed: bool = last is not None
         return completed
 
+    def is_defined(self, name: str) -> bool:
+        """
+        Checks whether a (possibly dotted) name resolves in the shell's
+        namespace, by lookup rather than evaluation
+        """
+        defined: bool = self.lookup(name)
+        if self.lookups is not None:
+            self.lookups[name] = defined
+        return defined
+
+    def lookup(self, name: str) -> bool:
+        """
+        Resolves a dotted name through locals, globals and builtins
+        """
+        root, *attributes = name.split(".")
+        if root in self.locals:
+            value: Type = self.locals[root]
+        elif root in self.globals:
+            value = self.globals[root]
+        elif hasattr(builtins, root):
+            value = getattr(builtins, root)
+        else:
+            return False
+        for attribute in attributes:
+            try:
+                value = getattr(value, attribute)
+            except Exception:
+                return False
+        return True
+
+    def dotted_name(self, node: ast.AST) -> str:
+        """
+        Returns "a.b.c" for a chain of attributes on a name, otherwise None
+        """
+        attributes: List[str] = []
+        while isinstance(node, ast.Attribute):
+            attributes.insert(0, node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        return ".".join([node.id] + attributes)
+
     def with_quotes_if_undefined(self, name: str) -> str:
         """
         Checks whether name is defined (if not, adds quotes around it)
+        A piece counts as defined if it parses as python and every
+        name it refers to can be looked up
         """
         try:
-            eval(name, self.globals, self.locals)
-            return name
-        except:
-            return f'"{name}"'
+            tree: ast.AST = ast.parse(name, mode="eval")
+        except SyntaxError:
+            return repr(name)
+        nodes: List[ast.AST] = list(ast.walk(tree))
+        bound: set = {i.arg for i in nodes if isinstance(i, ast.arg)} | {
+            i.id for i in nodes if isinstance(i, ast.Name) and isinstance(i.ctx, ast.Store)
+        }
+        for node in nodes:
+            if isinstance(node, (ast.Name, ast.Attribute)):
+                dotted: str = self.dotted_name(node)
+                if dotted is None or dotted.split(".")[0] in bound:
+                    continue
+                if not self.is_defined(dotted):
+                    return repr(name)
+        return name
 
     def flatten_list(self, list_of_lists: List[list]) -> list:
         """
@@ -114,22 +267,7 @@ class ClamShell:
         """
         Splits items from start to end of splitter, without interception
         """
-        split: str = splitters[0]
-        segments: list = []
-        accumulator: str = ""
-
-        for char in string:
-            if char == split:
-                accumulator += char
-                segments.append(accumulator)
-                accumulator: str = ""
-            elif accumulator == "" and char in splitters:
-                accumulator += char
-                split = char
-            else:
-                accumulator += char
-        segments.append(accumulator)
-        return segments
+        return splitter_pattern(tuple(splitters)).findall(string)
 
     def break_into_pieces(self, string: str) -> List[str]:
         """
@@ -168,6 +306,14 @@ class ClamShell:
         reformed: str = self.reform(pieces)
         return reformed
 
+    @meta_functions.capture_and_return_exception
+    def code_exec(self, code: types.CodeType) -> Type:
+        """
+        Runs already compiled code, returning its value
+        (or None for statements)
+        """
+        return eval(code, self.globals, self.locals)
+
     @meta_functions.capture_and_return_exception
     def clam_exec(self, command: str) -> Type:
         """
@@ -178,12 +324,8 @@ class ClamShell:
 
     @meta_functions.capture_and_return_exception
     def shell_exec(self, command: str) -> str:
-        for key, value in self.aliases.items():
-            if command[: len(key)] == key:
-                command = value + command[len(key) :]
-                break
-        pieces: List[str] = self.break_into_pieces(command)
-        output: int = subprocess.call(pieces)
+        output: int = pipelines.run_pipeline(command, self.aliases)
+        self.status = output
         output = f"\n[italic]output: {output}[/italic]"
         return output
 
@@ -196,26 +338,163 @@ class ClamShell:
         command += "()"
         return self.python_exec(command)
 
+    def column_style(self, column: str) -> str:
+        """
+        Returns rich style used for the given FileList column
+        """
+        return defaultdict(
+            lambda: "", {"name": "cyan", "path": "italic", "type": "green"}
+        )[column]
+
+    def print_stream(self) -> None:
+        """
+        Prints items from a generator output as they arrive,
+        stopping early (and closing the generator) on Ctrl-C
+        """
+        try:
+            for item in self.output:
+                if isinstance(item, Mapping):
+                    item = "  ".join(
+                        f"[{self.column_style(k)}]{escape(str(format_value(k, v)))}[/]"
+                        if self.column_style(k)
+                        else escape(str(format_value(k, v)))
+                        for k, v in item.items()
+                    )
+                elif isinstance(item, str):
+                    # lines like "[ERROR] ..." are text, not rich markup
+                    item = escape(item)
+                print(item)
+        except KeyboardInterrupt:
+            print("[italic]stopped[/italic]")
+        finally:
+            self.output.close()
+
+    def screen_rows(self) -> int:
+        """
+        Returns number of FileList rows to show at once
+        (self.max_rows, or enough to fit the terminal)
+        """
+        if self.max_rows is not None:
+            return self.max_rows
+        return max(10, shutil.get_terminal_size().lines - 6)
+
+    def column_widths(self, rows: FileList) -> Dict[str, int]:
+        """
+        Returns width for each column, sized from a sample of rows
+        rather than all of them
+        """
+        sample: FileList = rows[: self.sample_size]
+        return {
+            i: max([len(i)] + [len(j or "") for j in sample.formatted(i)])
+            for i in sample.columns
+        }
+
+    def file_table(self, rows: FileList, widths: Dict[str, int]) -> "Table":
+        """
+        Builds table of rows with fixed column widths
+        """
+        from rich.table import Table
+
+        table = Table()
+        for i, width in widths.items():
+            table.add_column(
+                i,
+                style=self.column_style(i),
+                max_width=width,
+                no_wrap=True,
+                overflow="ellipsis",
+            )
+        for i in zip(*[rows.formatted(j) for j in widths]):
+            table.add_row(*i)
+        return table
+
+    def print_file_list(self) -> None:
+        """
+        Prints as many rows as fit on screen, with a summary
+        of how many were left out
+        """
+        limit: int = self.screen_rows()
+        rows: FileList = self.output[:limit]
+        print(self.file_table(rows, self.column_widths(rows)))
+        if len(self.output) > limit:
+            self.truncated_output = self.output
+            print(
+                f"[italic]showing {limit} of {len(self.output)} rows "
+                "(run page to see them all)[/italic]"
+            )
+
+    def page(self, output: FileList = None) -> None:
+        """
+        Shows a FileList (or the last one cut short) a screen at a time,
+        only ever laying out one screen's worth of rows
+        """
+        output = meta_functions.coerce(output, self.truncated_output)
+        assert output, "Nothing to page through"
+        if not isinstance(output, FileList):
+            output = FileList(output)
+        limit: int = self.screen_rows()
+        widths: Dict[str, int] = self.column_widths(output)
+        try:
+            for start in range(0, len(output), limit):
+                print(self.file_table(output[start : start + limit], widths))
+                end: int = min(start + limit, len(output))
+                if end == len(output):
+                    break
+                answer: str = input(
+                    f"-- rows {start + 1}-{end} of {len(output)}, "
+                    "enter for more, q to stop -- "
+                )
+                if answer.strip().lower() == "q":
+                    break
+        except (KeyboardInterrupt, EOFError):
+            pass
+
+    def print_file_text(self) -> None:
+        """
+        Prints text read from a file, syntax highlighted, but only up to
+        self.max_text_lines lines of it (so only those are highlighted)
+        """
+        from rich.syntax import Syntax
+
+        text: FileText = self.output
+        body: str = text[:-1] if text.endswith("\n") else text
+        lines: List[str] = body.split("\n", self.max_text_lines)
+        shown: List[str] = lines[: self.max_text_lines]
+        print(
+            Syntax(
+                "\n".join(shown),
+                Syntax.guess_lexer(text.path),
+                line_numbers=text.first_line is not None,
+                start_line=text.first_line or 1,
+                background_color="default",
+            )
+        )
+        if len(lines) > self.max_text_lines or not text.complete:
+            shown_bytes: int = len("\n".join(shown).encode())
+            print(
+                f"[italic]showing {len(shown)} lines ({shown_bytes} of {text.size} "
+                f"bytes) of {escape(text.path)} - pass head, tail, lines or "
+                "byte_range to read for other parts[/italic]"
+            )
+
     def print_output(self) -> None:
         """
         Custom print of output
         """
         if self.output is None:
             return
-        if isinstance(self.output, FileList) and len(self.output) > 0:
-            table = Table()
-            for i in self.output[0].keys():
-                table.add_column(
-                    i,
-                    style=defaultdict(
-                        lambda: "", {"name": "cyan", "path": "italic", "type": "green"}
-                    )[i],
-                )
-            for i in self.output:
-                table.add_row(*list(i.values()))
-            print(table)
-        else:
+        if isinstance(self.output, types.GeneratorType):
+            self.print_stream()
+        elif isinstance(self.output, FileList) and len(self.output) > 0:
+            self.print_file_list()
+        elif isinstance(self.output, FileText):
+            self.print_file_text()
+        elif isinstance(self.output, str):
             print(self.output)
+        else:
+            from rich.pretty import Pretty
+
+            print(Pretty(self.output, max_length=self.max_items))
 
     def compiles_without_errors(self, command: str) -> bool:
         """
@@ -228,55 +507,281 @@ class ClamShell:
         except SyntaxError:
             return False
 
+    def is_command(self, name: str) -> bool:
+        """
+        Returns true if name is an alias, an executable on the path or
+        "command" (which runs what follows it as an executable)
+        """
+        return (
+            name in self.aliases
+            or name == pipelines.external_prefix
+            or pipelines.command_table.resolve(name) is not None
+        )
+
+    def classify(self, command: str) -> Dispatch:
+        """
+        Works out, in a single pass, how a command should be run:
+            - As a super command if it's one of self.super_commands
+            - As a shell command if its first word isn't defined in python
+              but is an executable (and the line isn't a python statement)
+            - As "missing" (command not found) if its first word looks like
+              a command but is neither defined nor an executable, and the
+              line isn't a python statement
+            - As python if it parses as python
+            - As clam syntax if it compiles that way
+            - Otherwise as a shell command
+        """
+        stripped: str = command.strip()
+        if stripped in self.super_commands:
+            return Dispatch("super", compile(f"{stripped}()", "<clam>", "eval"))
+        head: str = stripped.split(None, 1)[0] if stripped else ""
+        undefined: bool = head != "" and not self.is_defined(head)
+        external: bool = undefined and self.is_command(head)
+        # a dotted name is only missing if what it starts with is too, so
+        # os.nonexistent gets python's AttributeError instead
+        root: str = head.split(".", 1)[0]
+        missing: bool = (
+            undefined
+            and not external
+            and command_word_pattern.match(head) is not None
+            and (root in ("", head) or not self.is_defined(root))
+        )
+        try:
+            tree: ast.Module = ast.parse(command)
+        except SyntaxError:
+            tree = None
+        if tree is None or (len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr)):
+            if external:
+                return Dispatch("shell")
+            if missing:
+                return Dispatch("missing")
+        if tree is not None:
+            if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+                expression: ast.Expression = ast.Expression(tree.body[0].value)
+                return Dispatch("python", compile(expression, "<clam>", "eval"))
+            return Dispatch("python", compile(tree, "<clam>", "exec"))
+        try:
+            return Dispatch("clam", compile(self.clam_compile(command), "<clam>", "eval"))
+        except SyntaxError:
+            return Dispatch("shell")
+
+    def dispatch_state(self) -> tuple:
+        """
+        Returns snapshot of the settings (other than python names)
+        that classify depends on
+        """
+        return (
+            tuple(self.super_commands),
+            tuple(self.aliases.items()),
+            os.environ.get("PATH"),
+            pipelines.command_table.generation,
+        )
+
+    def route_still_holds(self, command: str, route: str) -> bool:
+        """
+        Returns false if a shell or missing route no longer fits command,
+        because its first word has since appeared or gone (looked up
+        again each time, like bash, so misses and relative paths such as
+        ./run.sh are never trusted from an earlier lookup or directory)
+        """
+        if route not in ("shell", "missing"):
+            return True
+        return self.is_command(command.split(None, 1)[0]) == (route == "shell")
+
+    def cached_classify(self, command: str) -> Dispatch:
+        """
+        Returns classify(command), reusing the last result for the same
+        command text as long as the names it looked up still resolve the
+        same way, super_commands, aliases and $PATH haven't changed, and
+        (for shell commands) the command is still found (see route_still_holds)
+        """
+        state: tuple = self.dispatch_state()
+        cached: tuple = self.dispatch_cache.get(command)
+        if cached is not None:
+            dispatch, lookups, cached_state = cached
+            if (
+                cached_state == state
+                and all(self.lookup(k) == v for k, v in lookups.items())
+                and self.route_still_holds(command, dispatch.route)
+            ):
+                self.dispatch_cache.move_to_end(command)
+                self.timer.cached = True
+                return dispatch
+        self.timer.cached = False
+        self.lookups = {}
+        try:
+            dispatch = self.classify(command)
+            self.dispatch_cache[command] = (dispatch, self.lookups, state)
+        finally:
+            self.lookups = None
+        self.dispatch_cache.move_to_end(command)
+        while len(self.dispatch_cache) > self.dispatch_cache_size:
+            self.dispatch_cache.popitem(last=False)
+        return dispatch
+
     @meta_functions.capture_and_return_exception
     def meta_exec(self) -> None:
         """
-        Execution order for the self.command string, as follows:
-            - If 'super self.command' will run as so
-            - Otherwise, will see if it can compile to:
-                - Python
-                - Then "clam python"
-                - (Will run as one of those if it can)
-            - Will run as a subprocess if those conditions aren't met
-            - (or if python running throws a name error)
-        """
-        if self.command in self.super_commands:
-            result: Type = self.super_exec(self.command)
-        elif self.compiles_without_errors(self.command):
-            result: Type = self.python_exec(self.command)
-        elif self.compiles_without_errors(self.clam_compile(self.command)):
-            result: Type = self.clam_exec(self.command)
-        else:
-            result: Type = self.shell_exec(self.command)
-        if isinstance(result, str) and result.startswith("[red bold] ! >> NameError("):
-            python_result: Type = result
-            result: Type = self.shell_exec(self.command)
-            if isinstance(result, str) and result.startswith(
-                "[red bold] ! >> FileNotFoundError("
-            ):
-                result = python_result
+        Classifies the self.command string once (see classify),
+        then runs it by the chosen route, setting self.status to the
+        exit status of shell commands, or 1 if running it failed
+        """
+        self.status = 0
+        if self.is_background(self.command):
+            self.timer.route = "background"
+            with self.timer.phase("execute"):
+                self.output = self.background_exec(self.command.rstrip()[:-1].rstrip())
+            self.status = int(meta_functions.is_error(self.output))
+            return
+        with self.timer.phase("classify"):
+            dispatch: Dispatch = self.cached_classify(self.command)
+        self.timer.route = dispatch.route
+        with self.timer.phase("execute"):
+            if dispatch.route == "shell":
+                result: Type = self.shell_exec(self.command)
+            elif dispatch.route == "missing":
+                head: str = self.command.split(None, 1)[0]
+                result = f"[red bold] ! >> command not found: {escape(head)}[/red bold]"
+            else:
+                result = self.code_exec(dispatch.code)
+        if meta_functions.is_error(result):
+            self.status = 1
         self.output = result
 
+    def is_background(self, command: str) -> bool:
+        """
+        Returns true if command ends with a single & (run in background)
+        """
+        stripped: str = command.rstrip()
+        return stripped.endswith("&") and not stripped.endswith("&&")
+
+    @meta_functions.capture_and_return_exception
+    def background_exec(self, command: str) -> str:
+        """
+        Starts command as a background job, returning straight away
+        """
+        dispatch: Dispatch = self.cached_classify(command)
+        if dispatch.route == "missing":
+            raise pipelines.CommandNotFoundError(
+                f"command not found: {command.split(None, 1)[0]}"
+            )
+        if dispatch.route == "shell":
+            job: job_control.Job = job_control.job_manager.start_shell(
+                command, self.aliases
+            )
+        else:
+            job = job_control.job_manager.start_python(
+                command, lambda: eval(dispatch.code, self.globals, self.locals)
+            )
+        return f"[italic][{job.job_id}] started[/italic]"
+
+    def report_finished_jobs(self) -> None:
+        """
+        Prints any background jobs that finished since the last prompt
+        """
+        for job in job_control.job_manager.finished():
+            print(f"[italic][{job.job_id}] {job.status()}: {escape(job.command)}[/italic]")
+            if job.result() is not None:
+                print(job.result())
+
     def repl(self) -> None:
         """
         Central read-evaluate-print loop
         """
         self.command = None
+        self.report_finished_jobs()
         self.prompt()
-        self.meta_exec()
-        self.print_output()
+        if self.command is None:
+            return
+        self.run_command(self.command)
+
+    def run_command(self, command: str) -> None:
+        """
+        Runs command and prints its output, timing or profiling it
+        when asked to (see split_instrumented)
+        """
+        mode, self.command = self.split_instrumented(command)
+        self.timer.start(
+            mode is not None or self.show_timings or self.trace_file is not None
+        )
+        profiler: "cProfile.Profile" = None
+        if mode == "profile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            self.meta_exec()
+            with self.timer.phase("print"):
+                self.print_output()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        if profiler is not None:
+            print(instrumentation.profile_table(profiler, self.profile_rows))
+        self.report_timing(mode)
+
+    def split_instrumented(self, command: str) -> Tuple[str, str]:
+        """
+        Returns ("time" or "profile", rest of command) for commands
+        prefixed with time or profile (that aren't valid python as they
+        are), otherwise (None, command). To run an executable called time
+        or profile instead, use its path or "command time ..."
+        """
+        match = instrumented_pattern.match(command)
+        if match is None or self.compiles_without_errors(command):
+            return None, command
+        return match.group(1), match.group(2)
+
+    def report_timing(self, mode: str) -> None:
+        """
+        Writes timings for the last command to self.trace_file, and
+        prints them if they were asked for
+        """
+        if not self.timer.active:
+            return
+        record: dict = self.timer.record(self.command)
+        if self.trace_file is not None:
+            instrumentation.append_trace(self.trace_file, record)
+        if mode is not None or self.show_timings:
+            print(instrumentation.summary(record))
+
+    def get_prompt_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Returns the event loop prompts are read on, starting it in its
+        own thread on first use (so that async of prompt doesn't affect
+        anything ran, and the same loop is kept for the whole session)
+        """
+        if self.prompt_loop is None:
+            self.prompt_loop = asyncio.new_event_loop()
+            threading.Thread(target=self.prompt_loop.run_forever, daemon=True).start()
+        return self.prompt_loop
+
+    def read_line(self, message: str) -> str:
+        """
+        Reads a line from the session on the prompt loop
+        """
+
+        async def read() -> Tuple[str, BaseException]:
+            # KeyboardInterrupt escaping a task would stop the loop itself,
+            # so it's handed back to be raised here instead
+            try:
+                return await self.session.prompt_async(message), None
+            except (KeyboardInterrupt, EOFError) as exception:
+                return None, exception
+
+        line, exception = asyncio.run_coroutine_threadsafe(
+            read(), self.get_prompt_loop()
+        ).result()
+        if exception is not None:
+            raise exception
+        return line
 
     def initial_prompt(self) -> None:
         """
         Sets first prompt to self.command value
         """
-        self.command = self.session.prompt(
-            self.get_prompt(),
-            lexer=self.lexer,
-            auto_suggest=AutoSuggestFromHistory(),
-            key_bindings=self.key_bindings,
-            color_depth=ColorDepth.ANSI_COLORS_ONLY,
-        )
+        self.command = self.read_line(self.get_prompt())
 
     @meta_functions.try_else_none
     def continuation_prompt(self) -> None:
@@ -285,27 +790,17 @@ class ClamShell:
         """
         new_line: str = None
         while new_line != "":
-            new_line = self.session.prompt(
-                self.get_continuation_prompt(),
-                lexer=self.lexer,
-                auto_suggest=AutoSuggestFromHistory(),
-                key_bindings=self.key_bindings,
-                color_depth=ColorDepth.ANSI_COLORS_ONLY,
-            )
+            new_line = self.read_line(self.get_continuation_prompt())
             self.command += f"\n{new_line}"
 
     @meta_functions.try_else_none
     def prompt(self) -> None:
         """
-        Runs inital_prompt and continuation_prompt in own thread
-        (so that async of prompt doesn't affect anything ran)
+        Runs inital_prompt, then continuation_prompt while the
+        command looks unfinished
         """
-        th: threading.Thread = threading.Thread(target=meta_functions.try_else_none(self.initial_prompt))
-        th.start()
-        th.join()
+        self.initial_prompt()
         if self.command != "" and (
             self.command[-1] == ":" or self.is_uncompleted(self.command)
         ):
-            th: threading.Thread = threading.Thread(target=meta_functions.try_else_none(self.continuation_prompt))
-            th.start()
-            th.join()
+            self.continuation_prompt()
@@ -5,12 +5,15 @@ from subprocess import run
 import time
 import shutil
 import glob
-from typing import List
+import fnmatch
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from collections.abc import Mapping
+from contextlib import nullcontext
+from typing import Dict, Iterator, List, Tuple
 
-from send2trash import send2trash
-
-from . import meta_functions
-from .types import FileList
+from . import file_reader, meta_functions, pipelines, search_engine
+from .indexes import DirectoryMap, Frecency, TrigramIndex
+from .types import FileInfo, FileList
 
 
 def is_windows() -> bool:
@@ -78,72 +81,317 @@ def file_metadata(path):
         "type": get_type(path),
     }
 
-def files(path=None, hidden=False, recursive=0):
-    file_info = [file_metadata(i) for i in os.listdir(path)]
-    file_info = [i for i in file_info if i is not None]
-    if not hidden:
-        file_info = [i for i in file_info if not i['name'].startswith('.')]
-    file_info = FileList(file_info)
-    if recursive == 0:
-        return file_info
-    for folder in [i['path'] for i in file_info if i['type'] == 'folder']:
-        try:
-            file_info += FileList(files(folder, recursive-1))
-        except:
-            pass
-    return file_info
+def files(path=None, hidden=False, recursive=0, ignore=True):
+    if recursive:
+        return FileList.from_entries(
+            i.entry for i in walk_files(path, hidden, recursive, ignore)
+        )
+    # scanned by absolute path, so columns read later (after a goto, say)
+    # still refer to these files rather than ones relative to the new cwd
+    with os.scandir(os.path.abspath(path or ".")) as entries:
+        return FileList.from_entries(
+            i for i in entries if hidden or not i.name.startswith('.')
+        )
+
+
+def read_gitignore(directory: str) -> List[Tuple[str, str, bool]]:
+    rules = []
+    try:
+        with open(os.path.join(directory, ".gitignore"), "r") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        line = line.strip()
+        # negations aren't supported, so we'd rather list too much than too little
+        if line == "" or line.startswith("#") or line.startswith("!"):
+            continue
+        rules.append((directory, line.rstrip("/"), line.endswith("/")))
+    return rules
+
+
+def is_ignored(entry: os.DirEntry, rules: List[Tuple[str, str, bool]]) -> bool:
+    for directory, pattern, directory_only in rules:
+        if directory_only and not entry.is_dir(follow_symlinks=False):
+            continue
+        if "/" in pattern:
+            relative = os.path.relpath(entry.path, directory).replace(splitter, "/")
+            if fnmatch.fnmatch(relative, pattern.lstrip("/")):
+                return True
+        elif fnmatch.fnmatch(entry.name, pattern):
+            return True
+    return False
+
+
+def scan_directory(path, hidden, rules, skip_errors=True):
+    try:
+        with os.scandir(path) as entries:
+            entries = [i for i in entries if hidden or not i.name.startswith(".")]
+    except OSError:
+        if not skip_errors:
+            raise
+        return [], []
+    if rules is not None:
+        rules = rules + read_gitignore(path)
+        entries = [i for i in entries if not is_ignored(i, rules)]
+    folders = [i.path for i in entries if i.is_dir(follow_symlinks=False)]
+    return [FileInfo(i) for i in entries], [(i, rules) for i in folders]
+
+
+def walk_files(path=None, hidden=False, recursive=1, ignore=True) -> Iterator[FileInfo]:
+    """
+    Yields files below path, scanning folders up to recursive levels deep
+    in a thread pool and yielding each folder's contents as soon as it's read.
+    With ignore, skips names in ignore_patterns and anything .gitignore'd.
+    """
+    root = os.path.abspath(path or ".")
+    rules = None
+    if ignore:
+        rules = [(root, i, False) for i in ignore_patterns]
+    executor = ThreadPoolExecutor()
+    # a missing or unreadable root is an error (as for files), while
+    # folders below it that can't be read are just skipped
+    pending = {executor.submit(scan_directory, root, hidden, rules, False): 0}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                depth = pending.pop(future)
+                found, folders = future.result()
+                yield from found
+                if depth < recursive:
+                    for folder, folder_rules in folders:
+                        new: Future = executor.submit(
+                            scan_directory, folder, hidden, folder_rules
+                        )
+                        pending[new] = depth + 1
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
 
 
 def clear():
     os.system(clear_command)
 
 
+def start_indexes():
+    # loads the directory map and frecency, then refreshes the map (and
+    # search index) in the background, once, on first use or at startup
+    global indexes_started
+    if indexes_started:
+        return
+    indexes_started = True
+    directory_map.load()
+    directory_map.refresh_in_background(after=refresh_search_index)
+    frecency.load()
+
+
+def find_directory(path: str) -> List[str]:
+    start_indexes()
+    match = directory_map.matches(path)
+    if len(match) == 0:
+        # map may still be building in the background on first run
+        directory_map.wait()
+        match = directory_map.matches(path)
+    return frecency.rank(match + frecency.matches(path))
+
+
+def complete_directory(name: str) -> List[str]:
+    start_indexes()
+    return frecency.rank(directory_map.starting_with(name))[:50]
+
+
+def existing_directory(path: str) -> bool:
+    # only the best matches are checked, forgetting visits to any that have gone
+    if os.path.isdir(path):
+        return True
+    frecency.forget(path)
+    return False
+
+
 def goto(path="."):
+    start_indexes()
     old_location = os.getcwd()
-    if isinstance(path, dict):
+    if isinstance(path, Mapping):
         path = path["path"]
     try:
         os.chdir(path)
     except:
-        match = [i for i in directory_map if i.endswith(path)]
-        assert len(match) > 0, "No matching directory found"
-        os.chdir(match[0])
+        match = next((i for i in find_directory(path) if existing_directory(i)), None)
+        assert match is not None, "No matching directory found"
+        os.chdir(match)
     # now let's add the current directory to the path
     # and remove the previous one
     new_location = os.getcwd()
+    frecency.visit(new_location)
     if new_location not in sys.path:
         sys.path.append(new_location)
     if old_location not in original_path and old_location in sys.path:
         sys.path.remove(old_location)
 
 
-def delete(path: str):
-    if isinstance(path, dict):
-        path = path["path"]
-    send2trash(path)
-    return f"[green]{path} sent to recycle bin[/green]"
+def source_paths(source) -> Tuple[List[str], bool]:
+    """
+    Returns paths for a path, glob, FileList row, or iterable of any of
+    those, and whether more than one path could have been meant
+    """
+    if isinstance(source, Mapping):
+        return [source["path"]], False
+    if isinstance(source, str):
+        source = os.path.expanduser(source)
+        if not glob.has_magic(source):
+            return [source], False
+        paths = sorted(glob.glob(source))
+        assert len(paths) > 0, f"Nothing matches {source}"
+        return paths, True
+    paths = []
+    for item in source:
+        paths += source_paths(item)[0]
+    return paths, True
+
+
+def copy_file(source: str, destination: str) -> str:
+    """
+    Copies a file (with its permissions and times), letting the kernel
+    move the data for big files rather than reading it through python
+    """
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+    if os.path.getsize(source) < kernel_copy_threshold or not hasattr(
+        os, "copy_file_range"
+    ):
+        # shutil already uses sendfile where it can
+        return shutil.copy2(source, destination)
+    try:
+        with open(source, "rb") as reader, open(destination, "wb") as writer:
+            while os.copy_file_range(reader.fileno(), writer.fileno(), 1 << 30) > 0:
+                pass
+    except OSError:
+        # copy_file_range isn't supported across every filesystem
+        shutil.copyfile(source, destination)
+    shutil.copystat(source, destination)
+    return destination
 
 
-def move(source: str, destination: str):
-    if isinstance(source, dict):
-        source = source["path"]
-    shutil.move(source, destination)
-    return f"[green]{source} moved to {destination}[/green]"
+def copy_path(source: str, destination: str) -> str:
+    if os.path.isdir(source):
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, os.path.basename(source))
+        return shutil.copytree(source, destination, copy_function=copy_file)
+    return copy_file(source, destination)
 
 
-def copy(source: str, destination: str):
-    if isinstance(source, dict):
-        source = source["path"]
-    shutil.copy(source, destination)
-    return "f[green]{source} copied to {destination}[/green]"
+def attempt(function, path: str, *args) -> List[Tuple[str, Exception]]:
+    try:
+        function(path, *args)
+        return []
+    except Exception as exception:
+        return [(path, exception)]
+
 
+def trash_batch(paths: List[str]) -> List[Tuple[str, Exception]]:
+    from send2trash import send2trash
 
-def read(source: str):
-    if isinstance(source, dict):
+    try:
+        send2trash(paths)
+        return []
+    except Exception:
+        # find out which ones failed (anything already gone made it)
+        failures = []
+        for path in paths:
+            if os.path.lexists(path):
+                failures += attempt(send2trash, path)
+        return failures
+
+
+def run_transfers(tasks: List[Tuple], verb: str, progress: bool) -> List[Tuple[str, Exception]]:
+    """
+    Runs (function, count, *args) tasks in a thread pool, showing a progress
+    bar for big jobs, and returns (path, exception) for anything that failed.
+    Ctrl-C cancels whatever hasn't started yet.
+    """
+    from rich.progress import Progress
+
+    total = sum(i[1] for i in tasks)
+    failures = []
+    executor = ThreadPoolExecutor(max_workers=transfer_workers)
+    bar = None
+    if progress and total >= progress_threshold:
+        bar = Progress(transient=True)
+    try:
+        with bar or nullcontext():
+            bar_task = bar.add_task(verb, total=total) if bar else None
+            pending = {executor.submit(i[0], *i[2:]): i[1] for i in tasks}
+            for future in as_completed(pending):
+                failures += future.result()
+                if bar:
+                    bar.advance(bar_task, pending[future])
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return failures
+
+
+def transfer_report(verb: str, paths: List[str], failures, destination=None):
+    from rich import print
+
+    if not failures:
+        where = f" to {destination}" if destination is not None else ""
+        return f"[green]{len(paths)} items {verb}{where}[/green]"
+    print(f"[red bold]{len(paths) - len(failures)} items {verb}, {len(failures)} failed[/red bold]")
+    return FileList(
+        {"name": os.path.basename(path), "path": path, "error": repr(exception)}
+        for path, exception in failures
+    )
+
+
+def delete(path: str, progress=True):
+    from send2trash import send2trash
+
+    paths, many = source_paths(path)
+    if not many:
+        send2trash(paths[0])
+        return f"[green]{paths[0]} sent to recycle bin[/green]"
+    batches = [paths[i : i + trash_batch_size] for i in range(0, len(paths), trash_batch_size)]
+    failures = run_transfers(
+        [(trash_batch, len(i), i) for i in batches], "deleting", progress
+    )
+    return transfer_report("sent to recycle bin", paths, failures)
+
+
+def move(source: str, destination: str, progress=True):
+    paths, many = source_paths(source)
+    destination = os.path.expanduser(destination)
+    if not many:
+        shutil.move(paths[0], destination)
+        return f"[green]{paths[0]} moved to {destination}[/green]"
+    os.makedirs(destination, exist_ok=True)
+    failures = run_transfers(
+        [(attempt, 1, shutil.move, i, destination) for i in paths], "moving", progress
+    )
+    return transfer_report("moved", paths, failures, destination)
+
+
+def copy(source: str, destination: str, progress=True):
+    paths, many = source_paths(source)
+    destination = os.path.expanduser(destination)
+    if not many:
+        copy_path(paths[0], destination)
+        return f"[green]{paths[0]} copied to {destination}[/green]"
+    os.makedirs(destination, exist_ok=True)
+    failures = run_transfers(
+        [(attempt, 1, copy_path, i, destination) for i in paths], "copying", progress
+    )
+    return transfer_report("copied", paths, failures, destination)
+
+
+def read(source: str, head=None, tail=None, lines=None, byte_range=None, follow=False):
+    if isinstance(source, Mapping):
         source = source["path"]
-    with open(source, "r") as file:
-        output = file.read()
-    return output
+    source = os.path.expanduser(source)
+    if follow:
+        return file_reader.follow(source, tail or 10)
+    return file_reader.read(source, head, tail, lines, byte_range)
 
 
 def make_file(path: str):
@@ -189,71 +437,193 @@ def break_into_pieces(string):
     return pieces
 
 
-@meta_functions.try_else_empty_list
-def file_line_matches(search_string: str, file_to_search: dict):
-    matches = FileList()
-    with open(file_to_search["path"], "r") as match:
-        lines = match.readlines()
-    for i, line in enumerate(lines):
-        if search_string in line:
-            matches.append(
-                {
-                    "name": file_to_search["name"],
-                    "path": file_to_search["path"],
-                    "line_number": i,
-                    "line": line,
-                }
-            )
-    return matches
-
-
-def search(search_string: str, path: str = None, recursive=False):
-    files_to_search = files(path, recursive)
-    files_to_search = [i for i in files_to_search if i["type"] == "file"]
-    matches = []
-    for file_to_search in files_to_search:
-        matches += file_line_matches(search_string, file_to_search)
-    return matches
-
-
-def pipe(*args):
+def search(
+    search_string: str,
+    path: str = None,
+    recursive=0,
+    regex=False,
+    ignore_case=False,
+    hidden=False,
+    stream=False,
+    max_results=None,
+    files_only=False,
+    indexed=True,
+):
+    matches = search_matches(
+        search_string,
+        path,
+        recursive,
+        regex,
+        ignore_case,
+        hidden,
+        max_results,
+        files_only,
+        indexed,
+    )
+    if stream:
+        return matches
+    found = FileList()
+    try:
+        for match in matches:
+            found.append(match)
+    except KeyboardInterrupt:
+        # Ctrl-C stops the search but keeps what's been found so far
+        matches.close()
+    return found
+
+
+def search_matches(
+    search_string: str,
+    path: str = None,
+    recursive=0,
+    regex=False,
+    ignore_case=False,
+    hidden=False,
+    max_results=None,
+    files_only=False,
+    indexed=True,
+):
+    pattern = search_engine.compile_pattern(search_string, regex, ignore_case)
+    directory = os.path.abspath(path or ".")
+    if path is not None and os.path.isfile(path):
+        paths = iter([directory])
+    elif (
+        indexed
+        and not regex
+        and not hidden
+        and len(search_string) >= 3
+        and search_index.root_of(directory) is not None
+    ):
+        paths = iter(indexed_candidates(search_string, directory, recursive))
+    else:
+        # skipping the same (ignored) files as the index does
+        files_to_search = walk_files(path, hidden, recursive)
+        paths = (i["path"] for i in files_to_search if i["type"] == "file")
+    results = search_engine.search_files(paths, pattern, files_only)
+    count = 0
+    try:
+        for file_path, lines in results:
+            for line_number, line in lines:
+                if files_only:
+                    yield {"name": os.path.basename(file_path), "path": file_path}
+                else:
+                    yield {
+                        "name": os.path.basename(file_path),
+                        "path": file_path,
+                        "line_number": line_number,
+                        "line": line,
+                    }
+                count += 1
+                if max_results is not None and count >= max_results:
+                    return
+    finally:
+        results.close()
+
+
+def index_directory(path=None):
+    directory = os.path.abspath(path or ".")
+    search_index.add_root(directory)
+    update_search_index(directory)
+    return f"[green]{directory} indexed for search[/green]"
+
+
+def unindex_directory(path=None):
+    directory = os.path.abspath(path or ".")
+    search_index.remove_root(directory)
+    return f"[green]{directory} removed from search index[/green]"
+
+
+def update_search_index(directory, recursive=None):
+    depth = index_depth if recursive is None else min(recursive, index_depth)
+    walk = walk_files(directory, recursive=depth)
+    # straight from the entries (whose paths are already absolute), as
+    # this runs before every indexed search
+    search_index.update(
+        directory, (i.entry.path for i in walk if i.entry.is_file()), depth
+    )
+    index_checked[directory] = (time.monotonic(), depth)
+
+
+def refresh_search_index():
+    for root in search_index.roots():
+        update_search_index(root)
+
+
+def indexed_candidates(search_string, directory, recursive):
+    # bring this part of the index up to date first, only as deep as the
+    # search goes, so recent edits are never missed (unless index_ttl
+    # says a check in the last few seconds is recent enough)
+    checked, checked_depth = index_checked.get(directory, (None, -1))
+    fresh = (
+        checked is not None
+        and checked_depth >= recursive
+        and time.monotonic() - checked < index_ttl
+    )
+    if not fresh:
+        update_search_index(directory, recursive)
+    depth = directory.rstrip(splitter).count(splitter)
+    return [
+        i
+        for i in search_index.candidates(directory, search_string)
+        if i.count(splitter) - depth - 1 <= recursive
+    ]
+
+
+def rehash():
+    pipelines.command_table.rehash()
+    return "[green]forgot remembered command locations[/green]"
+
+
+def stream(command: str, function=None):
+    if function is None:
+        return pipelines.stream_pipeline(command)
+    return pipelines.pipe_into(command, function)
+
+
+def pipe(*args, stream=False, workers=0, processes=False, buffer=64):
+    if stream:
+        return pipelines.stream_stages(args[0], args[1:], workers, processes, buffer)
     result = args[0]
     for call in args[1:]:
         result = call(result)
     return result
 
-def map_all_dirs(parent: str, current_depth: int = 0, max_depth: int = 2) -> List[str]:
-    initial_dir = os.getcwd()
-    os.chdir(parent)
-    # if we've hit bottom depth, we'll return empty list
-    if current_depth > max_depth:
-        return []
-    # otherwise, let's add all children to the list
-    # and then return it
-    new_dirs: List[str] = [i['path'] for i in files(parent) if i["type"] == "directory"]
-    # we'll add home if this is the first run
-    if current_depth == 0:
-        new_dirs.append(parent)
-    # lets get rid of windows non-dot "AppData" which will map too many things
-    if is_windows():
-        new_dirs = [i for i in new_dirs if "AppData" not in i]
-    # then add recursive steps
-    to_recur: List[str] = new_dirs.copy()
-    for i in to_recur:
-        try:
-            new_dirs += map_all_dirs(i, current_depth + 1, max_depth)
-        except:
-            pass
-    os.chdir(initial_dir)
-    new_dirs = [i for i in new_dirs if i is not None]
-    return new_dirs
+
+def get_config_directory() -> str:
+    """
+    Returns directory clamshell keeps its config and caches in
+    """
+    return f"{home}{splitter}.config{splitter}clamshell"
 
 
 splitter: str = get_splitter()
 home: str = get_home()
 original_path: str = sys.path.copy()
 clear_command: str = get_clear_command()
-directory_map: List[str] = map_all_dirs(home)
+ignore_patterns: List[str] = ["node_modules", ".venv", "venv", ".git", "__pycache__"]
+config_directory: str = get_config_directory()
+directory_map: DirectoryMap = DirectoryMap(
+    home, f"{config_directory}{splitter}directory_map.json"
+)
+search_index: TrigramIndex = TrigramIndex(
+    f"{config_directory}{splitter}search_index.sqlite"
+)
+index_depth: int = 64
+# seconds an indexed search trusts the index after checking a directory's
+# files (0, the default, checks before every search so edits are never missed)
+index_ttl: float = 0
+# when each directory's part of the search index was last checked, and how deep
+index_checked: Dict[str, Tuple[float, int]] = {}
+# threads used by bulk copy, move and delete
+transfer_workers: int = 8
+# files at least this big are copied with copy_file_range
+kernel_copy_threshold: int = 1024 * 1024
+# paths handed to send2trash at once by bulk delete
+trash_batch_size: int = 64
+# bulk operations on fewer items than this don't show a progress bar
+progress_threshold: int = 20
+frecency: Frecency = Frecency(f"{config_directory}{splitter}frecency.json")
+indexes_started: bool = False
 
 
 def coerce(value, default):
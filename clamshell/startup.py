@@ -0,0 +1,54 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+# seconds startup (up to the first prompt) is expected to take
+startup_budget: float = 0.5
+# (name, seconds) for each phase of startup so far
+phases: List[Tuple[str, float]] = []
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Times the code inside it as one named phase of startup
+    """
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.append((name, time.perf_counter() - start))
+
+
+def total() -> float:
+    return sum(i[1] for i in phases)
+
+
+def report() -> bool:
+    """
+    Prints time taken by each phase of startup, returning
+    true if the total was within startup_budget
+    """
+    from rich import print
+
+    for name, seconds in phases:
+        print(f"{name:<20}{seconds * 1000:>8.1f} ms")
+    within: bool = total() <= startup_budget
+    colour: str = "green" if within else "red bold"
+    print(
+        f"[{colour}]{'total':<20}{total() * 1000:>8.1f} ms "
+        f"(budget {startup_budget * 1000:.0f} ms)[/{colour}]"
+    )
+    return within
+
+
+def report_if_asked() -> None:
+    """
+    Reports on startup for --profile-startup, and for --check-startup
+    also exits (with status 1 if startup went over budget)
+    """
+    if "--profile-startup" in sys.argv or "--check-startup" in sys.argv:
+        within: bool = report()
+        if "--check-startup" in sys.argv:
+            sys.exit(0 if within else 1)
@@ -1,3 +1,581 @@
-class FileList(list):
-    pass
+import os
+import time
+from array import array
+from collections.abc import Mapping, MutableSequence, Sequence
+from types import CodeType
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Type
 
+from . import meta_functions
+
+
+# columns kept as packed numbers (by array typecode), with nan or -1 for missing
+numeric_columns: Dict[str, str] = {
+    "created": "d",
+    "modified": "d",
+    "size": "q",
+    "line_number": "q",
+    "count": "q",
+    "last used": "d",
+}
+# columns kept as one byte codes into a fixed tuple of values, with -1 for missing
+category_columns: Dict[str, Tuple[str, ...]] = {"type": ("file", "directory")}
+# numeric columns shown as dates
+timestamp_columns: Tuple[str, ...] = ("created", "modified", "last used")
+
+
+def format_value(column: str, value: Type) -> str:
+    """
+    Returns value as it should be displayed in column (None if missing)
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if column in timestamp_columns and isinstance(value, (int, float)):
+        return time.ctime(value)
+    return str(value)
+
+
+@meta_functions.try_else_none
+def entry_created(entry: os.DirEntry) -> float:
+    return entry.stat().st_ctime
+
+
+@meta_functions.try_else_none
+def entry_modified(entry: os.DirEntry) -> float:
+    return entry.stat().st_mtime
+
+
+@meta_functions.try_else_none
+def entry_type(entry: os.DirEntry) -> str:
+    if entry.is_file():
+        return "file"
+    return "directory"
+
+
+@meta_functions.try_else_none
+def entry_size(entry: os.DirEntry) -> int:
+    return entry.stat().st_size
+
+
+# how each file column is read from an os.DirEntry
+entry_readers: Dict[str, Callable[[os.DirEntry], Type]] = {
+    "name": lambda entry: entry.name,
+    "path": lambda entry: os.path.abspath(entry.path),
+    "created": entry_created,
+    "modified": entry_modified,
+    "type": entry_type,
+    "size": entry_size,
+}
+
+
+def encode_value(column: str, typecode: str, value: Type) -> Type:
+    """
+    Returns value as stored in a packed column, raising TypeError
+    if it can't be stored there
+    """
+    if typecode == "b":
+        if value is None:
+            return -1
+        if isinstance(value, str) and value in category_columns[column]:
+            return category_columns[column].index(value)
+    elif typecode == "d":
+        if value is None:
+            return float("nan")
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif typecode == "q":
+        if value is None:
+            return -1
+        if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2**63:
+            return value
+    raise TypeError(f"{value!r} can't be stored in column {column}")
+
+
+def decode_value(column: str, typecode: str, value: Type) -> Type:
+    """
+    Returns a value stored in a packed column as a python value
+    """
+    if typecode == "b":
+        return category_columns[column][value] if value >= 0 else None
+    if typecode == "d":
+        return None if value != value else value
+    return None if value == -1 else value
+
+
+def empty_column(column: str, length: int) -> Sequence:
+    """
+    Returns a column of length missing values, packed if column is
+    one of numeric_columns or category_columns
+    """
+    if column in category_columns:
+        return array("b", [-1]) * length
+    if column in numeric_columns:
+        typecode: str = numeric_columns[column]
+        return array(typecode, [encode_value(column, typecode, None)]) * length
+    return [None] * length
+
+
+def encode_column(column: str, values: List[Type]) -> Sequence:
+    """
+    Returns values as a packed array if they all fit in one,
+    otherwise as a list
+    """
+    typecode: str = "b" if column in category_columns else numeric_columns.get(column)
+    if typecode is None:
+        return list(values)
+    try:
+        return array(typecode, [encode_value(column, typecode, i) for i in values])
+    except TypeError:
+        return list(values)
+
+
+class FileRow(Mapping):
+    """
+    Read-only view of one row of a FileList
+    """
+
+    def __init__(self, file_list: "FileList", index: int):
+        self.file_list: FileList = file_list
+        self.index: int = index
+
+    def __getitem__(self, key: str) -> Type:
+        return self.file_list.value(key, self.index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.file_list.columns)
+
+    def __len__(self) -> int:
+        return len(self.file_list.columns)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class FileList(MutableSequence):
+    """
+    Table of rows (files, search matches, jobs...) stored as one sequence
+    per column rather than one dict per row. Timestamps, sizes and line
+    numbers are packed arrays of numbers and file types are one byte codes.
+
+    Lists of files are built straight from os.DirEntry objects, and each
+    column is only read (for every row at once) when first used, so a
+    listing that is only filtered by name never stats anything.
+
+    Otherwise it works like the list of dicts it replaces: indexing gives
+    FileRow mappings (views, so row["name"] works as it would on a dict),
+    slicing gives a new FileList, rows can be set, inserted, deleted and
+    sorted in place, and lists with the same rows are equal.
+    """
+
+    # mutable, like list
+    __hash__ = None
+
+    def __init__(self, rows: Iterable[Mapping] = ()):
+        self.columns: List[str] = []
+        self.data: Dict[str, Sequence] = {}
+        self.entries: List[os.DirEntry] = None
+        self.length: int = 0
+        if isinstance(rows, FileList):
+            self.columns = list(rows.columns)
+            self.data = {k: v[:] for k, v in rows.data.items()}
+            self.entries = None if rows.entries is None else list(rows.entries)
+            self.length = rows.length
+        else:
+            self.extend(rows)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[os.DirEntry]) -> "FileList":
+        """
+        Returns list of files for entries, reading their columns lazily
+        (apart from path, so it still points at them if the cwd changes)
+        """
+        entries = list(entries)
+        paths: List[str] = [os.path.abspath(i.path) for i in entries]
+        return cls.from_columns(list(entry_readers), {"path": paths}, len(entries), entries)
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns: List[str],
+        data: Dict[str, Sequence],
+        length: int,
+        entries: List[os.DirEntry] = None,
+    ) -> "FileList":
+        file_list: FileList = cls()
+        file_list.columns = list(columns)
+        file_list.data = data
+        file_list.entries = entries
+        file_list.length = length
+        return file_list
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FileList.from_columns(
+                self.columns,
+                {k: v[index] for k, v in self.data.items()},
+                len(range(*index.indices(self.length))),
+                self.entries[index] if self.entries is not None else None,
+            )
+        return FileRow(self, self.position(index))
+
+    def __setitem__(self, index, row) -> None:
+        if isinstance(index, slice):
+            rows: List[dict] = [dict(i) for i in row]
+            indices: range = range(*index.indices(self.length))
+            if index.step not in (None, 1):
+                assert len(rows) == len(indices), "Slice and rows differ in length"
+                for i, new_row in zip(indices, rows):
+                    self[i] = new_row
+                return
+            del self[index]
+            for offset, new_row in enumerate(rows):
+                self.insert(indices.start + offset, new_row)
+            return
+        index = self.position(index)
+        row = dict(row)
+        self.load_columns(row)
+        for column in self.columns:
+            self.store(column, row.get(column), index, replace=True)
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            removed: int = len(range(*index.indices(self.length)))
+        else:
+            index, removed = self.position(index), 1
+        for data in self.data.values():
+            del data[index]
+        if self.entries is not None:
+            del self.entries[index]
+        self.length -= removed
+
+    def __iter__(self) -> Iterator[FileRow]:
+        return (FileRow(self, i) for i in range(self.length))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (FileList, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __add__(self, other: Iterable[Mapping]) -> "FileList":
+        combined: FileList = FileList(self)
+        combined.extend(other)
+        return combined
+
+    def __iadd__(self, other: Iterable[Mapping]) -> "FileList":
+        self.extend(other)
+        return self
+
+    def __repr__(self) -> str:
+        shown: List[dict] = [dict(i) for i in self[:5]]
+        more: str = f", ... {self.length - 5} more" if self.length > 5 else ""
+        return f"FileList({shown!r}{more})"
+
+    def position(self, index: int) -> int:
+        """
+        Returns index (which may count from the end) as a position in
+        the list, raising IndexError if there's no row there
+        """
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("FileList index out of range")
+        return index
+
+    def raw(self, column: str) -> Sequence:
+        """
+        Returns column as stored (reading it from the entries on first use)
+        """
+        if column not in self.data:
+            if self.entries is None or column not in self.columns:
+                raise KeyError(column)
+            reader: Callable = entry_readers[column]
+            self.data[column] = encode_column(column, [reader(i) for i in self.entries])
+            if len(self.data) == len(self.columns):
+                self.entries = None
+        return self.data[column]
+
+    def column(self, column: str) -> List[Type]:
+        """
+        Returns every value in column, as python values
+        """
+        data: Sequence = self.raw(column)
+        if not isinstance(data, array):
+            return data
+        return [decode_value(column, data.typecode, i) for i in data]
+
+    def value(self, column: str, index: int) -> Type:
+        data: Sequence = self.raw(column)
+        if isinstance(data, array):
+            return decode_value(column, data.typecode, data[index])
+        return data[index]
+
+    def formatted(self, column: str) -> List[str]:
+        """
+        Returns every value in column as it should be displayed
+        """
+        return [format_value(column, i) for i in self.column(column)]
+
+    def load_columns(self, row: Mapping) -> None:
+        """
+        Reads any columns still waiting to be read (as rows can't be
+        written to those), and adds empty columns for any new ones in row
+        """
+        for column in self.columns:
+            self.raw(column)
+        self.entries = None
+        for column in row:
+            if column not in self.data:
+                self.columns.append(column)
+                self.data[column] = empty_column(column, self.length)
+
+    def insert(self, index: int, row: Mapping) -> None:
+        # like list.insert, positions past either end insert at that end
+        if index < 0:
+            index = max(index + self.length, 0)
+        index = min(index, self.length)
+        row = dict(row)
+        self.load_columns(row)
+        for column in self.columns:
+            self.store(column, row.get(column), index)
+        self.length += 1
+
+    def append(self, row: Mapping) -> None:
+        self.insert(self.length, row)
+
+    def extend(self, rows: Iterable[Mapping]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def pop(self, index: int = -1) -> dict:
+        # a copy, as a FileRow would see whatever row moved into its place
+        row: dict = dict(self[index])
+        del self[index]
+        return row
+
+    def clear(self) -> None:
+        del self[:]
+
+    def copy(self) -> "FileList":
+        return FileList(self)
+
+    def reverse(self) -> None:
+        self.reorder(list(range(self.length))[::-1])
+
+    def sort(self, key: Callable[[FileRow], Type] = None, reverse: bool = False) -> None:
+        """
+        Sorts rows in place, like list.sort (see sort_by to sort on a
+        column, missing values and all, into a new FileList)
+        """
+        rows: List[FileRow] = list(self)
+        keys: List[Type] = rows if key is None else [key(i) for i in rows]
+        self.reorder(sorted(range(self.length), key=keys.__getitem__, reverse=reverse))
+
+    def reorder(self, indices: List[int]) -> None:
+        reordered: FileList = self.take(indices)
+        self.data, self.entries = reordered.data, reordered.entries
+
+    def store(self, column: str, value: Type, index: int = None, replace: bool = False) -> None:
+        """
+        Inserts value into column at index (or adds it to the end), or with
+        replace, overwrites the value there, unpacking the column if value
+        doesn't fit in it
+        """
+        data: Sequence = self.data[column]
+        if index is None:
+            index = len(data)
+        if isinstance(data, array):
+            try:
+                encoded: Type = encode_value(column, data.typecode, value)
+                if replace:
+                    data[index] = encoded
+                else:
+                    data.insert(index, encoded)
+                return
+            except TypeError:
+                data = self.data[column] = self.column(column)
+        if replace:
+            data[index] = value
+        else:
+            data.insert(index, value)
+
+    def take(self, indices: List[int]) -> "FileList":
+        """
+        Returns new FileList of the rows at indices, in that order
+        """
+        data: Dict[str, Sequence] = {}
+        for column, values in self.data.items():
+            taken: List[Type] = [values[i] for i in indices]
+            data[column] = array(values.typecode, taken) if isinstance(values, array) else taken
+        entries: List[os.DirEntry] = None
+        if self.entries is not None:
+            entries = [self.entries[i] for i in indices]
+        return FileList.from_columns(self.columns, data, len(indices), entries)
+
+    def where(self, predicate: Callable[[FileRow], bool] = None, **conditions) -> "FileList":
+        """
+        Returns rows matching predicate (called with each row) and every
+        column=condition, where condition is a value to equal or a function
+        called with each of the column's values (missing values never match)
+            e.g. files().where(type="file", size=lambda i: i > 1000000)
+        """
+        indices: List[int] = list(range(self.length))
+        for column, condition in conditions.items():
+            data: Sequence = self.raw(column)
+            if column in category_columns and isinstance(data, array) and not callable(condition):
+                # compare the one byte codes rather than decoding each value
+                if condition not in category_columns[column]:
+                    return self.take([])
+                code: int = category_columns[column].index(condition)
+                indices = [i for i in indices if data[i] == code]
+                continue
+            values: List[Type] = self.column(column)
+            if callable(condition):
+                indices = [
+                    i for i in indices if values[i] is not None and condition(values[i])
+                ]
+            else:
+                indices = [i for i in indices if values[i] == condition]
+        if predicate is not None:
+            indices = [i for i in indices if predicate(FileRow(self, i))]
+        return self.take(indices)
+
+    def sort_by(self, column: str, reverse: bool = False) -> "FileList":
+        """
+        Returns rows sorted by column, with missing values last
+        """
+        values: List[Type] = self.column(column)
+        present: List[int] = [i for i in range(self.length) if values[i] is not None]
+        missing: List[int] = [i for i in range(self.length) if values[i] is None]
+        present.sort(key=values.__getitem__, reverse=reverse)
+        return self.take(present + missing)
+
+    def select(self, *columns: str) -> "FileList":
+        """
+        Returns FileList of only the given columns
+        """
+        for column in columns:
+            assert column in self.columns, f"No column {column}"
+        entries: List[os.DirEntry] = None
+        if self.entries is not None and any(i not in self.data for i in columns):
+            entries = list(self.entries)
+        return FileList.from_columns(
+            columns, {i: self.data[i][:] for i in columns if i in self.data}, self.length, entries
+        )
+
+    def head(self, rows: int = 10) -> "FileList":
+        return self[:rows]
+
+    def to_pandas(self):
+        """
+        Returns rows as a pandas DataFrame, sharing packed number columns
+        rather than copying them (timestamps stay as seconds since the
+        epoch, and type becomes a categorical)
+        """
+        import numpy
+        import pandas
+
+        frame: dict = {}
+        for column in self.columns:
+            data: Sequence = self.raw(column)
+            if not isinstance(data, array):
+                frame[column] = data
+            elif data.typecode == "b":
+                frame[column] = pandas.Categorical.from_codes(
+                    numpy.frombuffer(data, dtype=numpy.int8), category_columns[column]
+                )
+            elif data.typecode == "q" and -1 in data:
+                frame[column] = pandas.array(self.column(column), dtype="Int64")
+            else:
+                frame[column] = numpy.frombuffer(data, dtype=numpy.dtype(data.typecode))
+        return pandas.DataFrame(frame, copy=False)
+
+    def to_arrow(self):
+        """
+        Returns rows as a pyarrow Table, sharing the buffers of packed
+        number columns that have no missing values
+        """
+        import pyarrow
+
+        arrow_types: dict = {"b": pyarrow.int8(), "d": pyarrow.float64(), "q": pyarrow.int64()}
+        table: dict = {}
+        for column in self.columns:
+            data: Sequence = self.raw(column)
+            if not isinstance(data, array) or (data.typecode != "d" and -1 in data):
+                table[column] = pyarrow.array(self.column(column))
+                continue
+            values = pyarrow.Array.from_buffers(
+                arrow_types[data.typecode], len(data), [None, pyarrow.py_buffer(data)]
+            )
+            if data.typecode == "b":
+                values = pyarrow.DictionaryArray.from_arrays(
+                    values, pyarrow.array(category_columns[column])
+                )
+            table[column] = values
+        return pyarrow.table(table)
+
+
+class FileText(str):
+    """
+    Text read from a file, along with where it came from: the file's path
+    and size, the line number it starts on (None if unknown) and whether
+    it's the whole file
+    """
+
+    def __new__(
+        cls,
+        text: str,
+        path: str,
+        first_line: int = 1,
+        size: int = None,
+        complete: bool = True,
+    ) -> "FileText":
+        file_text: FileText = super().__new__(cls, text)
+        file_text.path = path
+        file_text.first_line = first_line
+        file_text.size = size
+        file_text.complete = complete
+        return file_text
+
+
+class Dispatch(NamedTuple):
+    """
+    How a command should be run: its route ("super", "python", "clam",
+    "shell" or "missing") and, for python routes, its compiled code
+    """
+
+    route: str
+    code: CodeType = None
+
+
+class FileInfo(Mapping):
+    """
+    Read-only row describing a file, built from an os.DirEntry
+    (used when streaming, rather than collecting into a FileList).
+
+    Columns are only worked out when first accessed (or rendered),
+    using the stat data the DirEntry has already cached.
+    """
+
+    columns: Tuple[str, ...] = tuple(entry_readers)
+
+    def __init__(self, entry: os.DirEntry):
+        self.entry: os.DirEntry = entry
+        self.values_cache: Dict[str, Type] = {}
+
+    def __getitem__(self, key: str) -> Type:
+        if key not in self.values_cache:
+            if key not in self.columns:
+                raise KeyError(key)
+            self.values_cache[key] = entry_readers[key](self.entry)
+        return self.values_cache[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.columns)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
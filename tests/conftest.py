@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# clamshell reads home (and keeps its config there) when first imported,
+# so tests get a disposable one before anything imports it
+os.environ["HOME"] = tempfile.mkdtemp(prefix="clamshell-tests-")
+os.environ["USERPROFILE"] = os.environ["HOME"]
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+from prompt_toolkit.document import Document
+
+from clamshell import shell_utils
+from clamshell.completion import ClamCompleter
+from clamshell.shell import ClamShell
+
+
+@pytest.mark.parametrize("typed", ["goto /tm", "goto '/tm", 'goto "/tm'])
+def test_mapped_directory_completion_runs_goto(tmp_path, monkeypatch, typed):
+    target = tmp_path / "mapped dir"
+    target.mkdir()
+    monkeypatch.setattr(shell_utils.frecency, "cache_file", str(tmp_path / "frecency.json"))
+    monkeypatch.chdir(tmp_path)
+    completer = ClamCompleter(lambda: [], get_directories=lambda word: [str(target)])
+    completion = next(completer.get_completions(Document(typed), None))
+    command = typed[: len(typed) + completion.start_position] + completion.text
+    shell = ClamShell(shell_globals={"goto": shell_utils.goto}, interactive=False)
+    assert shell.classify(command).route == "clam"
+    shell.command = command
+    shell.meta_exec()
+    assert os.getcwd() == str(target)
@@ -0,0 +1,29 @@
+from clamshell import file_reader
+from clamshell.shell import ClamShell
+
+
+def test_preview_of_one_long_line_is_capped_in_bytes(tmp_path):
+    path = tmp_path / "minified.json"
+    path.write_text('{"key": "' + "x" * 2 * 1024 * 1024 + '"}')
+    text = file_reader.read(str(path))
+    assert len(text) == file_reader.preview_bytes
+    assert not text.complete and text.size == path.stat().st_size
+
+
+def test_preview_is_cut_at_a_line_end(tmp_path):
+    path = tmp_path / "wide.log"
+    path.write_text(("y" * 999 + "\n") * 2000)
+    text = file_reader.read(str(path))
+    assert len(text) <= file_reader.preview_bytes and text.endswith("\n")
+    assert len(text.splitlines()) == file_reader.preview_bytes // 1000
+    assert len(file_reader.read(str(path), head=100).splitlines()) == 100
+
+
+def test_truncation_note_gives_bytes_shown(tmp_path, capsys):
+    path = tmp_path / "minified.json"
+    path.write_text("z" * 2 * 1024 * 1024)
+    shell = ClamShell(shell_globals={"x": 1}, interactive=False)
+    shell.output = file_reader.read(str(path))
+    shell.print_output()
+    note = " ".join(capsys.readouterr().out.split()[-20:])
+    assert f"({file_reader.preview_bytes} of {2 * 1024 * 1024} bytes)" in note
@@ -0,0 +1,90 @@
+import os
+from array import array
+
+import pytest
+
+from clamshell import shell_utils
+from clamshell.types import FileList
+
+
+@pytest.fixture
+def rows():
+    return FileList(
+        [
+            {"name": "b.txt", "type": "file", "size": 300, "modified": 2.0},
+            {"name": "a", "type": "directory", "size": None, "modified": 1.0},
+            {"name": "c.py", "type": "file", "size": 10, "modified": 3.5},
+        ]
+    )
+
+
+def test_columns_are_packed(rows):
+    assert rows.raw("size") == array("q", [300, -1, 10])
+    assert rows.raw("type") == array("b", [0, 1, 0])
+    assert rows.column("size") == [300, None, 10]
+    rows.append({"name": "d", "size": "huge"})
+    assert rows.column("size") == [300, None, 10, "huge"]
+    assert rows.column("type") == ["file", "directory", "file", None]
+
+
+def test_where_and_sort_by(rows):
+    assert [i["name"] for i in rows.where(type="file")] == ["b.txt", "c.py"]
+    assert [i["name"] for i in rows.where(size=lambda i: i > 100)] == ["b.txt"]
+    assert rows.where(type="socket") == []
+    assert [i["name"] for i in rows.where(lambda i: i["name"].endswith(".py"))] == ["c.py"]
+    assert [i["name"] for i in rows.sort_by("size")] == ["c.py", "b.txt", "a"]
+    assert [i["name"] for i in rows.sort_by("size", reverse=True)] == ["b.txt", "c.py", "a"]
+    assert rows.select("name", "size")[0] == {"name": "b.txt", "size": 300}
+
+
+def test_list_api(rows):
+    rows[0] = {"name": "e", "type": "file", "size": 5, "modified": 0.5}
+    rows.insert(0, {"name": "f", "size": 1})
+    assert [i["name"] for i in rows] == ["f", "e", "a", "c.py"]
+    rows.sort(key=lambda i: i["name"])
+    assert [i["name"] for i in rows] == ["a", "c.py", "e", "f"]
+    rows.reverse()
+    assert rows.pop() == {"name": "a", "type": "directory", "size": None, "modified": 1.0}
+    del rows[0]
+    rows[1:] = [{"name": "g"}, {"name": "h"}]
+    assert [i["name"] for i in rows] == ["e", "g", "h"]
+    assert rows.column("size") == [5, None, None]
+    rows.clear()
+    assert rows == [] and len(rows) == 0
+
+
+def test_selected_columns_are_independent(rows):
+    selected = rows.select("name")
+    selected.append({"name": "z"})
+    assert len(rows) == 3 and len(selected) == 4
+
+
+def test_equality(tmp_path):
+    (tmp_path / "one.txt").write_text("1")
+    (tmp_path / "two").mkdir()
+    assert shell_utils.files(str(tmp_path)) == shell_utils.files(str(tmp_path))
+    assert FileList([{"name": "x"}]) == [{"name": "x"}]
+    assert FileList([{"name": "x"}]) != FileList([{"name": "y"}])
+
+
+def test_paths_are_pinned_when_listed(tmp_path, monkeypatch):
+    (tmp_path / "one.txt").write_text("1")
+    monkeypatch.chdir(tmp_path)
+    listing = FileList.from_entries(os.scandir("."))
+    monkeypatch.chdir(os.path.dirname(tmp_path))
+    assert listing[0]["path"] == str(tmp_path / "one.txt")
+
+
+def test_deleting_from_copies_leaves_the_original(tmp_path):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(name)
+    for copy in (lambda i: i.copy(), lambda i: i.select("name", "size")):
+        listing = shell_utils.files(str(tmp_path))
+        copied = copy(listing)
+        del copied[0]
+        copied.pop()
+        assert len(copied) == 1
+        assert sorted(listing.column("name")) == ["a.txt", "b.txt", "c.txt"]
+        assert len(listing.column("size")) == 3
+        copied.clear()
+        assert len(listing.column("modified")) == 3
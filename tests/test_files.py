@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from clamshell import shell_utils
+
+
+def test_files_columns_survive_changing_directory(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "x.txt").write_text("hello")
+    start = os.getcwd()
+    try:
+        os.chdir(tmp_path / "a")
+        listing = shell_utils.files()
+        recursive = shell_utils.files(recursive=1)
+        os.chdir(tmp_path)
+        assert listing[0]["path"] == str(tmp_path / "a" / "x.txt")
+        assert listing[0]["size"] == 5
+        assert recursive[0]["path"] == str(tmp_path / "a" / "x.txt")
+        assert recursive[0]["type"] == "file"
+    finally:
+        os.chdir(start)
+
+
+def test_files_hides_dotfiles_unless_asked(tmp_path):
+    (tmp_path / ".hidden").write_text("")
+    (tmp_path / "shown").write_text("")
+    assert [i["name"] for i in shell_utils.files(str(tmp_path))] == ["shown"]
+    assert len(shell_utils.files(str(tmp_path), hidden=True)) == 2
+
+
+def test_missing_root_raises(tmp_path):
+    missing = str(tmp_path / "typo")
+    for call in (
+        lambda: shell_utils.files(missing),
+        lambda: shell_utils.files(missing, recursive=2),
+        lambda: shell_utils.search("x", missing, recursive=2, indexed=False),
+    ):
+        with pytest.raises(FileNotFoundError):
+            call()
+
+
+def test_unreadable_folders_below_root_are_skipped(tmp_path, monkeypatch):
+    (tmp_path / "locked").mkdir()
+    (tmp_path / "locked" / "inside.txt").write_text("x")
+    (tmp_path / "open.txt").write_text("x")
+    scandir = os.scandir
+
+    def locked_scandir(path):
+        if os.path.basename(path) == "locked":
+            raise PermissionError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", locked_scandir)
+    names = shell_utils.files(str(tmp_path), recursive=2).column("name")
+    assert sorted(names) == ["locked", "open.txt"]
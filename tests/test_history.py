@@ -0,0 +1,73 @@
+import sqlite3
+from itertools import count
+
+import pytest
+
+from clamshell.history import SQLiteHistory
+
+clock = count(1000)
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = SQLiteHistory(str(tmp_path / "history.sqlite"))
+    yield history
+    history.close()
+
+
+def store(history, monkeypatch, commands, directory="/"):
+    # each command is stored a second after the one before
+    monkeypatch.setattr("os.getcwd", lambda: directory)
+    for command in commands:
+        monkeypatch.setattr("time.time", lambda now=next(clock): now)
+        history.store_string(command)
+
+
+def test_suggest_prefers_current_directory(history, monkeypatch):
+    store(history, monkeypatch, ["git status"], "/project")
+    store(history, monkeypatch, ["git stash", "gitk"], "/elsewhere")
+    assert history.suggest("git st", "/project") == "git status"
+    assert history.suggest("git st", "/other") == "git stash"
+    assert history.suggest("git", "/other") == "gitk"
+    assert history.suggest("hg", "/project") is None
+    assert history.suggest("", "/project") is None
+
+
+def test_search_matches_words_in_order(history, monkeypatch):
+    store(
+        history,
+        monkeypatch,
+        ["git commit -m 'first'", "git add .", "commit git", "GIT COMMIT --amend"],
+    )
+    found = [i["command"] for i in history.search("git commit")]
+    assert found == ["GIT COMMIT --amend", "git commit -m 'first'"]
+    assert [i["command"] for i in history.search("add .")] == ["git add ."]
+    assert len(history.search()) == 4
+
+
+def test_search_treats_wildcards_literally(history, monkeypatch):
+    store(history, monkeypatch, ["echo 100%", "echo 1000", "print(a_b)", "print(ab)"])
+    assert [i["command"] for i in history.search("100%")] == ["echo 100%"]
+    assert [i["command"] for i in history.search("a_b")] == ["print(a_b)"]
+
+
+def test_search_forgets_pruned_commands(history, monkeypatch):
+    history.max_entries = 1
+    store(history, monkeypatch, ["make build", "make test"])
+    history.prune()
+    assert [i["command"] for i in history.search("make")] == ["make test"]
+
+
+def test_search_indexes_existing_databases(tmp_path):
+    database = str(tmp_path / "history.sqlite")
+    connection = sqlite3.connect(database)
+    with connection:
+        connection.execute(
+            "CREATE TABLE history (command TEXT PRIMARY KEY, count INTEGER, last_used REAL)"
+        )
+        connection.execute("INSERT INTO history VALUES ('docker compose up', 1, 0)")
+    connection.close()
+    history = SQLiteHistory(database)
+    assert history.indexed
+    assert [i["command"] for i in history.search("compose")] == ["docker compose up"]
+    history.close()
@@ -0,0 +1,126 @@
+import os
+import threading
+
+import pytest
+
+from clamshell import shell_utils
+from clamshell.indexes import DirectoryMap, Frecency, TrigramIndex
+
+
+def test_frecency_matches_whole_components(tmp_path):
+    frecency = Frecency(str(tmp_path / "frecency.json"))
+    frecency.visits = {"/x/foo_src": [5, 0], "/y/src": [1, 0], "/z/src/deeper": [1, 0]}
+    assert frecency.matches("src") == ["/y/src"]
+    assert frecency.matches("y/src") == ["/y/src"]
+
+
+def test_frecency_forget_saves(tmp_path):
+    frecency = Frecency(str(tmp_path / "frecency.json"))
+    frecency.visit("/gone")
+    frecency.forget("/gone")
+    frecency.load()
+    assert frecency.visits == {}
+
+
+def test_directory_map_matches_by_suffix(tmp_path):
+    for folder in ("a/src", "b/foo_src", "c/d"):
+        (tmp_path / folder).mkdir(parents=True)
+    directory_map = DirectoryMap(str(tmp_path), str(tmp_path / "map.json"))
+    directory_map.refresh()
+    assert directory_map.matches("src") == [str(tmp_path / "a" / "src")]
+    assert directory_map.matches("c/d") == [str(tmp_path / "c" / "d")]
+
+
+def test_goto_skips_and_forgets_missing_directories(tmp_path, monkeypatch):
+    (tmp_path / "real" / "target").mkdir(parents=True)
+    real = str(tmp_path / "real" / "target")
+    gone = str(tmp_path / "gone" / "target")
+    monkeypatch.setattr(shell_utils, "indexes_started", True)
+    monkeypatch.setattr(shell_utils, "find_directory", lambda path: [gone, real])
+    monkeypatch.setattr(shell_utils.frecency, "cache_file", str(tmp_path / "f.json"))
+    shell_utils.frecency.visits[gone] = [10, 0]
+    start = os.getcwd()
+    try:
+        shell_utils.goto("target")
+        assert os.getcwd() == real
+        assert gone not in shell_utils.frecency.visits
+    finally:
+        os.chdir(start)
+
+
+def test_shallow_index_update_keeps_deeper_files(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    top, deep = tmp_path / "top.txt", tmp_path / "a" / "b" / "deep.txt"
+    top.write_text("needle")
+    deep.write_text("needle")
+    index = TrigramIndex(str(tmp_path / "index.sqlite"))
+    index.update(str(tmp_path), [str(top), str(deep)])
+    index.update(str(tmp_path), [str(top)], depth=0)
+    assert sorted(index.candidates(str(tmp_path), "needle")) == [str(deep), str(top)]
+
+
+@pytest.fixture
+def indexed(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        shell_utils, "search_index", TrigramIndex(str(tmp_path / "index.sqlite"))
+    )
+    monkeypatch.setattr(shell_utils, "index_checked", {})
+    shell_utils.search_index.add_root(str(tmp_path))
+    walks = []
+    walk_files = shell_utils.walk_files
+    monkeypatch.setattr(
+        shell_utils,
+        "walk_files",
+        lambda *args, **kwargs: walks.append(kwargs) or walk_files(*args, **kwargs),
+    )
+    return walks
+
+
+def found(directory, text, **options):
+    return sorted(i["name"] for i in shell_utils.search(text, str(directory), **options))
+
+
+def test_indexed_search_sees_new_edits(tmp_path, indexed):
+    (tmp_path / "notes.txt").write_text("a needle here")
+    assert found(tmp_path, "needle", recursive=2) == ["notes.txt"]
+    (tmp_path / "a.txt").write_text("zebra")
+    (tmp_path / "notes.txt").write_text("zebra too")
+    assert found(tmp_path, "zebra", recursive=2) == ["a.txt", "notes.txt"]
+    assert indexed == [{"recursive": 2}, {"recursive": 2}]
+    assert found(tmp_path, "zebra", recursive=2, indexed=False) == ["a.txt", "notes.txt"]
+
+
+def test_indexed_search_reuses_recent_check_within_ttl(tmp_path, indexed, monkeypatch):
+    monkeypatch.setattr(shell_utils, "index_ttl", 60)
+    (tmp_path / "notes.txt").write_text("a needle here")
+    for _ in range(2):
+        assert found(tmp_path, "needle", recursive=2) == ["notes.txt"]
+    assert indexed == [{"recursive": 2}]
+    found(tmp_path, "needle", recursive=3)
+    assert indexed[-1] == {"recursive": 3}
+
+
+def test_indexed_and_plain_search_ignore_the_same_files(tmp_path, indexed):
+    (tmp_path / ".gitignore").write_text("build.txt\n")
+    (tmp_path / "build.txt").write_text("needle")
+    (tmp_path / "src.txt").write_text("needle")
+    assert found(tmp_path, "needle") == ["src.txt"]
+    assert found(tmp_path, "needle", indexed=False) == ["src.txt"]
+
+
+def test_directory_map_join_waits_for_what_runs_after(tmp_path):
+    (tmp_path / "a").mkdir()
+    directory_map = DirectoryMap(str(tmp_path), str(tmp_path / "map.json"))
+    release, finished = threading.Event(), []
+
+    def after():
+        release.wait(5)
+        finished.append(True)
+
+    directory_map.refresh_in_background(after=after)
+    directory_map.wait()
+    assert directory_map.matches("a") == [str(tmp_path / "a")]
+    assert finished == []
+    release.set()
+    directory_map.join()
+    assert finished == [True]
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+from clamshell import job_control
+from clamshell.shell import ClamShell
+
+
+def test_kill_reaches_the_kill_command():
+    # the job builtin is kill_job, so kill stays the system command
+    shell = ClamShell(
+        shell_globals={"kill_job": job_control.kill_job, "jobs": job_control.jobs},
+        interactive=False,
+    )
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        assert shell.classify(f"kill -9 {process.pid}").route == "shell"
+        shell.run_command(f"kill -9 {process.pid}")
+        assert shell.status == 0
+        assert process.wait(timeout=10) == -9
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def test_kill_job_stops_a_background_job():
+    shell = ClamShell(shell_globals={"kill_job": job_control.kill_job}, interactive=False)
+    shell.run_command("sleep 60 &")
+    job_id = max(job_control.job_manager.jobs)
+    shell.run_command(f"kill_job {job_id}")
+    assert shell.status == 0
+    job = job_control.job_manager.jobs[job_id]
+    assert job.processes[0].wait(timeout=10) != 0
@@ -0,0 +1,51 @@
+import pytest
+
+from clamshell import pipelines
+from clamshell.pipelines import Stage, parse_pipeline
+
+
+def test_parse_pipes_and_redirects():
+    assert parse_pipeline("sort < in.txt | uniq -c >> 'counts file'") == [
+        Stage(["sort"], stdin="in.txt"),
+        Stage(["uniq", "-c"], stdout="counts file", append=True),
+    ]
+    assert parse_pipeline("ls|wc -l>out") == [
+        Stage(["ls"]),
+        Stage(["wc", "-l"], stdout="out"),
+    ]
+
+
+def test_parse_expands_aliases_once():
+    aliases = {"ls": "ls --color", "ll": "ls -l"}
+    assert parse_pipeline("ll src | ll", aliases) == [
+        Stage(["ls", "--color", "-l", "src"]),
+        Stage(["ls", "--color", "-l"]),
+    ]
+
+
+@pytest.mark.parametrize("command", ["ls >", "ls | | wc", "| wc", "ls |"])
+def test_parse_rejects_broken_pipelines(command):
+    with pytest.raises(AssertionError):
+        parse_pipeline(command)
+
+
+@pytest.mark.parametrize(
+    "command",
+    ["ls missing 2>&1 | wc -l", "ls missing 2> errors", "make &> log", "echo hi >&2"],
+)
+def test_descriptor_redirects_go_to_system_shell(command):
+    assert parse_pipeline(command) == [Stage(pipelines.system_shell(command))]
+
+
+def test_descriptor_redirect_runs(tmp_path):
+    output = list(pipelines.stream_pipeline(f"ls {tmp_path / 'missing'} 2>&1 | wc -l"))
+    assert [i.strip() for i in output] == ["1"]
+
+
+def test_command_prefix_skips_aliases():
+    aliases = {"time": "echo timed", "ls": "ls --color"}
+    assert parse_pipeline("command time ls | command ls", aliases) == [
+        Stage(["time", "ls"]),
+        Stage(["ls"]),
+    ]
+    assert parse_pipeline("command", aliases) == [Stage(["command"])]
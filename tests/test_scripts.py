@@ -0,0 +1,89 @@
+import marshal
+import os
+
+import pytest
+
+from clamshell import scripts
+from clamshell.shell import ClamShell
+
+
+def new_shell(**options):
+    return ClamShell(
+        shell_globals={"greet": lambda *names: len(names)}, interactive=False, **options
+    )
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / "script.clam"
+    path.write_text("total = 0\nfor i in range(3):\n    total += i\n\ngreet world again\n")
+    return path
+
+
+def load(path):
+    with open(scripts.cache_path(str(path)), "rb") as file:
+        return marshal.load(file)
+
+
+def test_split_commands_joins_blocks_and_brackets(script):
+    assert scripts.split_commands(new_shell(), "x = [\n  1,\n]\n# note\n\nls\n") == [
+        "x = [\n  1,\n]",
+        "ls",
+    ]
+    assert scripts.split_commands(new_shell(), script.read_text()) == [
+        "total = 0",
+        "for i in range(3):\n    total += i",
+        "greet world again",
+    ]
+
+
+def test_unchanged_script_reuses_cache(script, monkeypatch):
+    assert scripts.run_script(new_shell(), str(script)) == 0
+    cache = load(script)
+    assert cache["dispatches"]["greet world again"][0] == "clam"
+    monkeypatch.setattr(
+        scripts, "split_commands", lambda *_: pytest.fail("script split again")
+    )
+    shell = new_shell()
+    monkeypatch.setattr(
+        shell, "classify", lambda command: pytest.fail(f"{command} classified again")
+    )
+    assert scripts.run_script(shell, str(script)) == 0
+    assert shell.locals["total"] == 3
+
+
+def test_edited_script_is_split_again(script):
+    scripts.run_script(new_shell(), str(script))
+    script.write_text("total = 10\n")
+    shell = new_shell()
+    scripts.run_script(shell, str(script))
+    assert shell.locals["total"] == 10
+    assert load(script)["commands"] == ["total = 10"]
+
+
+def classified_commands(script, monkeypatch, **options):
+    # runs script, returning the commands that weren't dispatched from cache
+    shell = new_shell(**options)
+    classify, classified = shell.classify, []
+    monkeypatch.setattr(
+        shell, "classify", lambda command: classified.append(command) or classify(command)
+    )
+    scripts.run_script(shell, str(script))
+    return classified
+
+
+def test_changed_environment_drops_dispatches(script, monkeypatch):
+    assert len(classified_commands(script, monkeypatch)) == 3
+    assert classified_commands(script, monkeypatch) == []
+    aliases = {"ll": "ls -l"}
+    assert len(classified_commands(script, monkeypatch, aliases=aliases)) == 3
+    assert classified_commands(script, monkeypatch, aliases=aliases) == []
+    monkeypatch.setenv("PATH", os.environ["PATH"] + os.pathsep + "/nonexistent")
+    assert len(classified_commands(script, monkeypatch, aliases=aliases)) == 3
+
+
+def test_stale_cache_version_is_ignored(script, monkeypatch):
+    scripts.run_script(new_shell(), str(script))
+    monkeypatch.setattr(scripts, "cache_version", scripts.cache_version + 1)
+    digest = load(script)["digest"]
+    assert scripts.load_cache(str(script), digest) is None
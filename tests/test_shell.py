@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+from clamshell.shell import ClamShell
+
+
+class Broken:
+    @property
+    def value(self):
+        raise RuntimeError("broken property")
+
+
+@pytest.fixture
+def shell():
+    return ClamShell(
+        shell_globals={"os": os, "greet": lambda *names: len(names), "broken": Broken()},
+        super_commands=["clear_screen"],
+        interactive=False,
+    )
+
+
+@pytest.mark.parametrize(
+    "command, route",
+    [
+        ("clear_screen", "super"),
+        ("ls -la", "shell"),
+        ("ls", "shell"),
+        ("nonexistent_command --flag", "missing"),
+        ("./nonexistent.sh", "missing"),
+        ("nonexistent.module", "missing"),
+        ("x = 1", "python"),
+        ("greet('world')", "python"),
+        ("os.nonexistent", "python"),
+        ("broken.value", "python"),
+        ("greet world again", "clam"),
+    ],
+)
+def test_classify_routes(shell, command, route):
+    assert shell.classify(command).route == route
+
+
+def test_dotted_names_keep_python_errors(shell):
+    shell.command = "os.nonexistent"
+    shell.meta_exec()
+    assert "AttributeError" in shell.output
+    shell.command = "broken.value"
+    shell.meta_exec()
+    assert "broken property" in shell.output
+
+
+def test_print_stream_shows_brackets_literally(shell, capsys):
+    shell.output = (i for i in ["[ERROR] failed [/bold]", "values [1, 2]"])
+    shell.print_stream()
+    assert capsys.readouterr().out.splitlines() == [
+        "[ERROR] failed [/bold]",
+        "values [1, 2]",
+    ]
+
+
+@pytest.mark.parametrize(
+    "command, split",
+    [
+        ("time = 3", (None, "time = 3")),
+        ("time.sleep(0)", (None, "time.sleep(0)")),
+        ("time ls", ("time", "ls")),
+        ("time ls -la | wc -l", ("time", "ls -la | wc -l")),
+        ("profile greet world", ("profile", "greet world")),
+        ("profile(1)", (None, "profile(1)")),
+        ("command time ls", (None, "command time ls")),
+    ],
+)
+def test_split_instrumented(shell, command, split):
+    assert shell.split_instrumented(command) == split
+
+
+def test_command_prefix_runs_executables(shell):
+    assert shell.classify("command time ls").route == "shell"
+    shell.run_command("command true")
+    assert shell.status == 0
+    shell.run_command("command false")
+    assert shell.status == 1
+
+
+def make_executable(path):
+    path.write_text("#!/bin/sh\necho ran\n")
+    path.chmod(0o755)
+
+
+def test_cached_relative_commands_follow_the_directory(shell, tmp_path, monkeypatch):
+    (tmp_path / "with").mkdir()
+    (tmp_path / "without").mkdir()
+    make_executable(tmp_path / "with" / "run.sh")
+    monkeypatch.chdir(tmp_path / "without")
+    assert shell.cached_classify("./run.sh").route == "missing"
+    monkeypatch.chdir(tmp_path / "with")
+    assert shell.cached_classify("./run.sh").route == "shell"
+    monkeypatch.chdir(tmp_path / "without")
+    assert shell.cached_classify("./run.sh").route == "missing"
+
+
+def test_cached_misses_see_newly_installed_commands(shell, tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    for _ in range(2):
+        assert shell.cached_classify("freshly_installed --flag").route == "missing"
+    make_executable(tmp_path / "freshly_installed")
+    assert shell.cached_classify("freshly_installed --flag").route == "shell"
+
+
+def test_time_prefix_readme_example(tmp_path, monkeypatch, capsys):
+    from clamshell.shell_utils import files
+
+    (tmp_path / "sub").mkdir()
+    monkeypatch.chdir(tmp_path)
+    shell = ClamShell(shell_globals={"files": files}, interactive=False)
+    shell.run_command("time files('.', recursive=3)")
+    assert shell.status == 0
+    assert "total" in capsys.readouterr().out.splitlines()[-1]
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+from clamshell import startup
+
+package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def check_startup(home):
+    return subprocess.run(
+        [sys.executable, "-m", "clamshell", "--check-startup"],
+        env={**os.environ, "HOME": str(home), "PYTHONPATH": package_root},
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+def test_startup_is_within_budget(tmp_path):
+    # the first run also writes bytecode and config, which later starts skip
+    check_startup(tmp_path)
+    result = check_startup(tmp_path)
+    for name in ("imports", "directory map", "session/history", "rc", "total"):
+        assert name in result.stdout
+    assert result.returncode == 0, result.stdout
+
+
+def test_report_compares_total_with_budget(monkeypatch, capsys):
+    monkeypatch.setattr(startup, "phases", [("imports", 0.1), ("rc", 0.2)])
+    assert startup.report()
+    monkeypatch.setattr(startup, "startup_budget", 0.25)
+    assert not startup.report()
+    assert "total" in capsys.readouterr().out